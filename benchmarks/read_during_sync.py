@@ -0,0 +1,192 @@
+"""
+Задержка чтения из БД во время полной синхронизации: настройки SQLite по умолчанию против профиля из настроек.
+
+Для каждого профиля в отдельном процессе (настройки читаются при импорте src) создается временная БД и выполняется
+начальная синхронизация. Затем замеряется задержка чтения станции по id и страницы станций без записи в БД и во время
+синхронизации, в которой изменены все станции обоих источников. Профиль default - журнал DELETE, synchronous=FULL,
+без mmap, кеш 2 МиБ и одно общее соединение для чтения и записи. Профиль tuned - значения из src/settings.
+
+Запуск из корня репозитория:
+    python -m benchmarks.read_during_sync --stations 20000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from benchmarks.source_data import generate_source_data, apply_churn
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Переменные окружения профилей, tuned использует значения по умолчанию из src/settings
+PROFILES = {
+    'default': dict(
+        DB_READ_WRITE_SPLIT='0',
+        SQLITE_JOURNAL_MODE='DELETE',
+        SQLITE_SYNCHRONOUS='FULL',
+        SQLITE_MMAP_SIZE='0',
+        SQLITE_CACHE_SIZE='-2000',
+        SQLITE_BUSY_TIMEOUT='5000',
+        SQLITE_TEMP_STORE='DEFAULT',
+    ),
+    'tuned': dict(),
+}
+PAGE_SIZE = 100
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Перцентиль по ближайшему рангу.
+    :param values: Отсортированный список значений
+    :param percent: Перцентиль от 0 до 100
+    """
+    if not values:
+        return 0.0
+    rank = max(1, int(round(percent / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+def summary(latencies: List[float], errors: int) -> dict:
+    latencies = sorted(latencies)
+    return dict(
+        count=len(latencies),
+        errors=errors,
+        p50_ms=round(percentile(latencies, 50) * 1000, 2),
+        p95_ms=round(percentile(latencies, 95) * 1000, 2),
+        p99_ms=round(percentile(latencies, 99) * 1000, 2),
+        max_ms=round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    )
+
+
+async def read_while(is_running, station_ids: List[int], readers: int, seed: int) -> dict:
+    """
+    Читать станции по id и постранично в readers параллельных задачах, пока is_running() возвращает True.
+    :return: {вид чтения: задержки}
+    """
+    from sqlalchemy.exc import OperationalError
+    from src.modules.repositories import GasStationRepository
+
+    latencies = dict(station=[], page=[])
+    errors = dict(station=0, page=0)
+
+    async def reader(number: int):
+        rnd = random.Random(seed + number)
+        cursor = None
+        while is_running():
+            if number % 2:
+                kind, call = 'station', GasStationRepository.get_station(rnd.choice(station_ids))
+            else:
+                kind, call = 'page', GasStationRepository.get_stations_page(['number', 'address'], cursor, PAGE_SIZE)
+            start = time.perf_counter()
+            try:
+                result = await call
+            except OperationalError:
+                errors[kind] += 1
+                continue
+            latencies[kind].append(time.perf_counter() - start)
+            if kind == 'page':
+                cursor = result[-1][0] if len(result) == PAGE_SIZE else None
+
+    await asyncio.gather(*(reader(number) for number in range(readers)))
+    return {kind: summary(latencies[kind], errors[kind]) for kind in latencies}
+
+
+async def run_profile(stations_count: int, readers: int, idle_seconds: float, seed: int) -> dict:
+    from src.db import engine, read_engine
+    from src.helpers import station_main_data_hash, station_fuel_data_hash
+    from src.modules import DataHandler
+
+    source_1, source_2 = generate_source_data(stations_count, seed)
+    station_ids = [station['id'] for station in source_1]
+
+    async def sync():
+        # Хеши считаются заранее, чтобы в замер попало время работы с БД, а не расчет хешей в цикле событий
+        await DataHandler.update_source_1_data(source_1, hashes_1)
+        await DataHandler.update_source_2_data(source_2, hashes_2)
+
+    hashes_1 = {station['id']: station_main_data_hash(station) for station in source_1}
+    hashes_2 = {station['id']: station_fuel_data_hash(station) for station in source_2}
+    await sync()
+
+    deadline = time.perf_counter() + idle_seconds
+    result = dict(idle=await read_while(lambda: time.perf_counter() < deadline, station_ids, readers, seed))
+
+    apply_churn(source_1, source_2, 1.0, 1.0, seed + 1)
+    hashes_1 = {station['id']: station_main_data_hash(station) for station in source_1}
+    hashes_2 = {station['id']: station_fuel_data_hash(station) for station in source_2}
+    start = time.perf_counter()
+    sync_task = asyncio.create_task(sync())
+    result['during_sync'] = await read_while(lambda: not sync_task.done(), station_ids, readers, seed)
+    await sync_task
+    result['sync_seconds'] = round(time.perf_counter() - start, 3)
+
+    engine.dispose()
+    read_engine.dispose()
+    return result
+
+
+def run_child(args) -> None:
+    temp_dir = tempfile.mkdtemp(prefix='read_during_sync_')
+    # Engine создается при импорте src.db, поэтому адрес БД нужно подменить до импорта
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(temp_dir, 'benchmark.db')}"
+    try:
+        from src.db import engine, migrate
+        migrate(engine)
+        # Логирование настраивается при импорте src.settings
+        logging.getLogger('main').setLevel(logging.WARNING)
+        result = asyncio.run(run_profile(args.stations, args.readers, args.idle_seconds, args.seed))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def run_parent(args) -> None:
+    results = {}
+    for profile in args.profiles:
+        command = [sys.executable, '-m', 'benchmarks.read_during_sync', '--child',
+                   '--stations', str(args.stations), '--readers', str(args.readers),
+                   '--idle-seconds', str(args.idle_seconds), '--seed', str(args.seed)]
+        output = subprocess.run(command, cwd=ROOT_DIR, env={**os.environ, **PROFILES[profile]},
+                                check=True, capture_output=True, text=True).stdout
+        results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    if args.json:
+        print(json.dumps(dict(stations=args.stations, readers=args.readers, profiles=results),
+                         ensure_ascii=False, indent=2))
+        return
+    print(f"Станций: {args.stations}, параллельных чтений: {args.readers}")
+    for profile, result in results.items():
+        print(f"{profile}: полная синхронизация {result['sync_seconds']:.3f} с")
+        for phase in ('idle', 'during_sync'):
+            for kind, stats in result[phase].items():
+                print(f"  {phase:11} {kind:7} p50 {stats['p50_ms']:8.2f} мс  p95 {stats['p95_ms']:8.2f} мс  "
+                      f"p99 {stats['p99_ms']:8.2f} мс  max {stats['max_ms']:8.2f} мс  "
+                      f"чтений {stats['count']}, ошибок {stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=20000)
+    parser.add_argument('--readers', type=int, default=4, help='количество параллельных чтений')
+    parser.add_argument('--idle-seconds', type=float, default=2, help='длительность замера без синхронизации')
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+    else:
+        run_parent(args)
+
+
+if __name__ == '__main__':
+    main()
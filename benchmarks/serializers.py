@@ -0,0 +1,108 @@
+"""
+Сравнение сериализации списка станций через модели pydantic и напрямую через src.schemas.serializers.
+
+Запуск из корня репозитория:
+    python -m benchmarks.serializers --stations 10000 --repeat 5
+"""
+import argparse
+import json
+import random
+import time
+
+from src.schemas import (GasStationUserValidData, AdditionalServiceData, FuelData, service_to_dict, fuel_to_dict,
+                         station_to_dict)
+
+
+def generate_rows(stations_count: int, seed: int = 0) -> list:
+    """
+    Сгенерировать строки в форме, которую возвращает репозиторий:
+    (external_id, number, address, longitude, latitude), [(id, title, img)], [(id, title, cost, currency, img)]
+    """
+    rnd = random.Random(seed)
+    services = [(i, f"Услуга {i}", rnd.choice(['', f"/img/service_{i}.png"])) for i in range(100)]
+    fuels = [(i, f"АИ-{90 + i}", f"/img/fuel_{i}.png") for i in range(10)]
+    rows = []
+    for station_id in range(stations_count):
+        station = (station_id, f"№ {station_id}", f"Адрес станции {station_id}",
+                   rnd.uniform(20, 140), rnd.uniform(40, 70))
+        station_services = rnd.sample(services, 10)
+        station_fuels = [(_fuel[0], _fuel[1], round(rnd.uniform(40, 70), 2), 'руб.', _fuel[2])
+                         for _fuel in rnd.sample(fuels, 6)]
+        rows.append((station, station_services, station_fuels))
+    return rows
+
+
+def serialize_pydantic(rows: list) -> bytes:
+    data = [
+        GasStationUserValidData(
+            id=station[0],
+            number=station[1],
+            address=station[2],
+            latitude=station[4],
+            longitude=station[3],
+            additional_services=[AdditionalServiceData(title=service[1], img=service[2] if service[2] else '')
+                                 for service in station_services],
+            fuels=[FuelData(title=_fuel[1], cost=_fuel[2], currency=_fuel[3], img=_fuel[4] if _fuel[4] else '')
+                   for _fuel in station_fuels]
+        ).dict()
+        for station, station_services, station_fuels in rows
+    ]
+    return dumps(data)
+
+
+def serialize_fast(rows: list) -> bytes:
+    data = [
+        station_to_dict(
+            external_id=station[0],
+            number=station[1],
+            address=station[2],
+            latitude=station[4],
+            longitude=station[3],
+            additional_services=[service_to_dict(service[1], service[2]) for service in station_services],
+            fuels=[fuel_to_dict(_fuel[1], _fuel[2], _fuel[3], _fuel[4]) for _fuel in station_fuels],
+        )
+        for station, station_services, station_fuels in rows
+    ]
+    return dumps(data)
+
+
+def dumps(data: list) -> bytes:
+    # Те же параметры, что в ApiAnswer.render
+    return json.dumps(dict(status="ok", data=data), ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def measure(func, rows: list, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args()
+
+    rows = generate_rows(args.stations)
+    if serialize_pydantic(rows) != serialize_fast(rows):
+        raise SystemExit("Результаты сериализации отличаются")
+    pydantic_time = measure(serialize_pydantic, rows, args.repeat)
+    fast_time = measure(serialize_fast, rows, args.repeat)
+    result = dict(stations=args.stations, pydantic_s=round(pydantic_time, 4), fast_s=round(fast_time, 4),
+                  speedup=round(pydantic_time / fast_time, 2))
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"Станций: {args.stations}")
+        print(f"pydantic: {pydantic_time * 1000:.1f} ms")
+        print(f"fast:     {fast_time * 1000:.1f} ms")
+        print(f"Ускорение: x{result['speedup']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""
+Замеры сервиса целиком на локальном синтетическом источнике данных.
+
+Поднимает вместо SOURCE_1_URL и SOURCE_2_URL локальный сервер с N станциями, на временной БД замеряет начальную
+синхронизацию и синхронизации после изменения части станций, затем запускает сервис через uvicorn в отдельном
+процессе и замеряет задержку (p50/p95/p99) и пропускную способность /get_all_stations_info и /get_station_info.
+Результат записывается в JSON, чтобы сравнивать замеры разных коммитов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.service --stations 10000 --main-churn 0.01 --fuel-churn 0.05 --output results.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.source_data import generate_source_data, apply_churn
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_1_PATH = '/get_gas_station_info'
+SOURCE_2_PATH = '/get_fuel_info'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """
+    Перцентиль по ближайшему рангу.
+    :param values: Отсортированный список значений
+    :param percent: Перцентиль от 0 до 100
+    """
+    if not values:
+        return 0.0
+    rank = max(1, int(round(percent / 100 * len(values) + 0.5)))
+    return values[min(rank, len(values)) - 1]
+
+
+class SourceServer:
+    """
+    Локальный источник данных в формате ответов SOURCE_1_URL и SOURCE_2_URL.
+    Отдает ETag и отвечает 304 на условный запрос, как это может делать настоящий источник.
+    """
+
+    def __init__(self, stations_count: int, seed: int):
+        self.port = free_port()
+        self.source_1, self.source_2 = generate_source_data(stations_count, seed)
+        self.bodies = {}
+        self.requests = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.render()
+
+    @property
+    def source_1_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}{SOURCE_1_PATH}"
+
+    @property
+    def source_2_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}{SOURCE_2_PATH}"
+
+    def render(self) -> None:
+        for path, data in ((SOURCE_1_PATH, self.source_1), (SOURCE_2_PATH, self.source_2)):
+            body = json.dumps(dict(status="ok", data=data), ensure_ascii=False).encode('utf-8')
+            self.bodies[path] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+
+    def churn(self, main_rate: float, fuel_rate: float, seed: int) -> tuple:
+        changed = apply_churn(self.source_1, self.source_2, main_rate, fuel_rate, seed)
+        self.render()
+        return changed
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        body, etag = self.bodies[request.path]
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get(SOURCE_1_PATH, self.handle)
+        app.router.add_get(SOURCE_2_PATH, self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', self.port).start()
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+
+async def measure_sync(source_handler) -> dict:
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    # Как проверки по расписанию SourceScheduler: 1 источник первым, чтобы цены 2 источника нашли новые станции
+    await source_handler.check_source(1)
+    await source_handler.check_source(2)
+    return dict(wall=round(time.perf_counter() - start_wall, 3), cpu=round(time.process_time() - start_cpu, 3))
+
+
+async def wait_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"Сервис завершился с кодом {process.returncode}")
+            try:
+                async with session.get(f"{base_url}/health/ready") as response:
+                    if response.status == 200:
+                        await response.read()
+                        return
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Сервис не ответил за {timeout} с")
+
+
+async def load(base_url: str, paths: List[str], concurrency: int, encoding: str) -> dict:
+    """
+    Выполнить запросы к сервису с заданным количеством одновременных запросов.
+    :param base_url: Адрес сервиса
+    :param paths: Пути запросов, выполняются по очереди свободными исполнителями
+    :param concurrency: Количество одновременных запросов
+    :param encoding: Значение заголовка Accept-Encoding
+    :return: Задержка по перцентилям в мс, пропускная способность, количество ответов и ошибок
+    """
+    latencies, errors = [], 0
+    queue = iter(paths)
+    headers = {'Accept-Encoding': encoding}
+
+    async def worker(session: aiohttp.ClientSession):
+        nonlocal errors
+        for path in queue:
+            start_time = time.perf_counter()
+            try:
+                async with session.get(f"{base_url}{path}", headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, auto_decompress=False) as session:
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        duration = time.perf_counter() - start_time
+
+    latencies.sort()
+    return dict(
+        requests=len(latencies),
+        errors=errors,
+        rps=round(len(latencies) / duration, 1) if duration else 0.0,
+        p50=round(percentile(latencies, 50), 2),
+        p95=round(percentile(latencies, 95), 2),
+        p99=round(percentile(latencies, 99), 2),
+        max=round(latencies[-1], 2) if latencies else 0.0,
+    )
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, database_url: str) -> dict:
+    source = SourceServer(args.stations, args.seed)
+    await source.start()
+    os.environ['SOURCE_1_URL'] = source.source_1_url
+    os.environ['SOURCE_2_URL'] = source.source_2_url
+
+    from src.db import engine, migrate
+    from src.modules import SourceHandler
+    migrate(engine)
+    # Логирование настраивается при импорте src.settings
+    logging.getLogger('main').setLevel(logging.WARNING)
+
+    result = dict(
+        commit=git_commit(),
+        created_at=datetime.now().isoformat(timespec='seconds'),
+        params=dict(stations=args.stations, main_churn=args.main_churn, fuel_churn=args.fuel_churn,
+                    syncs=args.syncs, requests=args.requests, concurrency=args.concurrency,
+                    encoding=args.encoding, seed=args.seed),
+    )
+    source_handler = SourceHandler()
+    try:
+        result['initial_sync'] = await measure_sync(source_handler)
+        result['unchanged_sync'] = await measure_sync(source_handler)
+        result['incremental_sync'] = []
+        for index in range(args.syncs):
+            main_changed, fuel_changed = source.churn(args.main_churn, args.fuel_churn, args.seed + index + 1)
+            sync = await measure_sync(source_handler)
+            result['incremental_sync'].append(dict(sync, main_changed=main_changed, fuel_changed=fuel_changed))
+    finally:
+        await source_handler.close()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ, DATABASE_URL=database_url)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'src.api:app', '--host', '127.0.0.1', '--port', str(port),
+         '--log-level', 'warning', '--no-access-log'],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        start_time = time.perf_counter()
+        await wait_ready(base_url, process, args.startup_timeout)
+        result['service_startup'] = round(time.perf_counter() - start_time, 3)
+
+        rnd = random.Random(args.seed)
+        station_ids = [station['id'] for station in source.source_1]
+        result['endpoints'] = {
+            '/get_all_stations_info': await load(
+                base_url, ['/get_all_stations_info'] * max(1, args.requests // 10), args.concurrency, args.encoding),
+            '/get_station_info': await load(
+                base_url, [f"/get_station_info?station_id={rnd.choice(station_ids)}" for _ in range(args.requests)],
+                args.concurrency, args.encoding),
+        }
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await source.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, default=10000)
+    parser.add_argument('--main-churn', type=float, default=0.01, help='доля станций 1 источника, меняемых за шаг')
+    parser.add_argument('--fuel-churn', type=float, default=0.05, help='доля станций 2 источника, меняемых за шаг')
+    parser.add_argument('--syncs', type=int, default=3, help='количество синхронизаций после изменения данных')
+    parser.add_argument('--requests', type=int, default=2000, help='количество запросов к /get_station_info, '
+                                                                     'к /get_all_stations_info - в 10 раз меньше')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--encoding', default='gzip', help='заголовок Accept-Encoding запросов к сервису')
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для записи результата в JSON')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='service_benchmark_')
+    database_url = f"sqlite:///{os.path.join(temp_dir, 'benchmark.db')}"
+    # Engine создается при импорте src.db, поэтому адрес БД нужно подменить до импорта
+    os.environ['DATABASE_URL'] = database_url
+    try:
+        result = asyncio.run(run(args, database_url))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    data = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(data)
+    print(data)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Генерация синтетических данных источников в формате ответов SOURCE_1_URL и SOURCE_2_URL.
+"""
+import random
+from typing import List, Tuple
+
+__all__ = (
+    'generate_source_data',
+    'apply_churn',
+)
+
+SERVICES = [f"Услуга {i}" for i in range(60)]
+FUELS = [f"АИ-{90 + i}" for i in range(8)] + ['ДТ', 'Газ']
+
+
+def generate_source_data(stations_count: int, seed: int = 0) -> Tuple[List[dict], List[dict]]:
+    """
+    Сгенерировать станции 1 и 2 источника.
+    :param stations_count: Количество станций
+    :param seed: Начальное значение генератора случайных чисел
+    :return: (станции 1 источника, станции 2 источника)
+    """
+    rnd = random.Random(seed)
+    source_1, source_2 = [], []
+    for station_id in range(stations_count):
+        source_1.append(dict(
+            id=station_id,
+            number=f"№ {station_id}",
+            address=f"Адрес станции {station_id}",
+            latitude=round(rnd.uniform(41.0, 70.0), 6),
+            longitude=round(rnd.uniform(20.0, 140.0), 6),
+            img_list=[],
+            additional_services=rnd.sample(SERVICES, rnd.randint(3, 12)),
+        ))
+        source_2.append(dict(
+            id=station_id,
+            fuel=[dict(title=title, cost=round(rnd.uniform(40, 70), 2), currency='руб.', img='')
+                  for title in rnd.sample(FUELS, rnd.randint(2, 6))],
+        ))
+    return source_1, source_2
+
+
+def apply_churn(source_1: List[dict], source_2: List[dict], main_rate: float, fuel_rate: float,
+                seed: int = 0) -> Tuple[int, int]:
+    """
+    Изменить часть станций на месте: адрес и услуги в 1 источнике, цены во 2 источнике.
+    :param source_1: Станции 1 источника
+    :param source_2: Станции 2 источника
+    :param main_rate: Доля станций 1 источника, которые нужно изменить
+    :param fuel_rate: Доля станций 2 источника, у которых нужно изменить цены
+    :param seed: Начальное значение генератора случайных чисел
+    :return: (количество измененных станций 1 источника, количество измененных станций 2 источника)
+    """
+    rnd = random.Random(seed)
+    main_changed = rnd.sample(source_1, int(len(source_1) * main_rate))
+    for station in main_changed:
+        station['address'] = f"{station['address']} ({seed})"
+        station['additional_services'] = rnd.sample(SERVICES, rnd.randint(3, 12))
+    fuel_changed = rnd.sample(source_2, int(len(source_2) * fuel_rate))
+    for station in fuel_changed:
+        for _fuel in station['fuel']:
+            _fuel['cost'] = round(_fuel['cost'] + rnd.choice((-1, 1)) * rnd.uniform(0.1, 2), 2)
+    return len(main_changed), len(fuel_changed)
@@ -0,0 +1,103 @@
+"""
+Затраты CPU на один опрос источников: модели pydantic для всех станций против моделей только для измененных.
+
+Для каждого размера создается временная БД, выполняется начальная синхронизация, после чего выполняются опросы
+с заданной долей измененных станций и опрос без изменений. В опрос входит расчет хешей, сравнение с БД,
+построение моделей и запись в БД.
+
+Запуск из корня репозитория:
+    python -m benchmarks.sync_pipeline --stations 10000 100000 --churn 0.01
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.source_data import generate_source_data, apply_churn
+
+
+def measure(coroutine_factory) -> dict:
+    start_cpu, start_wall = time.process_time(), time.perf_counter()
+    asyncio.run(coroutine_factory())
+    return dict(cpu=round(time.process_time() - start_cpu, 3), wall=round(time.perf_counter() - start_wall, 3))
+
+
+def run(stations_count: int, churn: float, seed: int) -> dict:
+    from src.db import engine
+    from src.helpers import station_main_data_hash, station_fuel_data_hash
+    from src.modules import DataHandler
+    from src.modules.repositories import GasStationRepository
+
+    source_1, source_2 = generate_source_data(stations_count, seed)
+
+    async def lazy_poll():
+        # Так опрос выполняет SourceHandler: хеши считаются один раз и передаются в DataHandler
+        hashes_1 = {station["id"]: station_main_data_hash(station) for station in source_1}
+        await DataHandler.update_source_1_data(source_1, hashes_1)
+        hashes_2 = {station["id"]: station_fuel_data_hash(station) for station in source_2}
+        await DataHandler.update_source_2_data(source_2, hashes_2)
+
+    async def eager_poll():
+        # Прежний порядок: модели строятся для всех станций, сравнение хешей выполняется в репозитории
+        hashes_1 = {station["id"]: station_main_data_hash(station) for station in source_1}
+        stations_1 = DataHandler._DataHandler__get_main_data_dict(source_1, hashes_1)
+        await GasStationRepository.bulk_sync_main_data(stations_1)
+        hashes_2 = {station["id"]: station_fuel_data_hash(station) for station in source_2}
+        stations_2 = DataHandler._DataHandler__get_fuel_data_dict(source_2, hashes_2)
+        await GasStationRepository.bulk_sync_fuel_data(stations_2)
+
+    result = dict(stations=stations_count, churn=churn, initial_sync=measure(lazy_poll))
+    for name, poll in (('eager', eager_poll), ('lazy', lazy_poll)):
+        seed += 1
+        apply_churn(source_1, source_2, churn, churn, seed)
+        result[f"{name}_changed"] = measure(poll)
+        result[f"{name}_unchanged"] = measure(poll)
+    engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stations', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--churn', type=float, default=0.01, help='доля измененных станций за опрос')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='sync_pipeline_')
+    # Engine создается при импорте src.db, поэтому адрес БД нужно подменить до импорта
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(temp_dir, 'benchmark.db')}"
+
+    from sqlalchemy import delete
+    from src.db import engine, Base, migrate
+    migrate(engine)
+    # Логирование настраивается при импорте src.settings
+    logging.getLogger('main').setLevel(logging.WARNING)
+
+    results = []
+    try:
+        for stations_count in args.stations:
+            with engine.begin() as connection:
+                for table in reversed(Base.metadata.sorted_tables):
+                    connection.execute(delete(table))
+            results.append(run(stations_count, args.churn, args.seed))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for result in results:
+        print(f"Станций: {result['stations']}, изменено за опрос: {result['churn']:.1%}")
+        print(f"  начальная синхронизация   cpu {result['initial_sync']['cpu']:.3f} с")
+        for name in ('eager', 'lazy'):
+            print(f"  {name:5} с изменениями      cpu {result[f'{name}_changed']['cpu']:.3f} с, "
+                  f"без изменений cpu {result[f'{name}_unchanged']['cpu']:.3f} с")
+
+
+if __name__ == '__main__':
+    main()
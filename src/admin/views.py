@@ -2,6 +2,9 @@ from sqladmin import ModelView
 from sqlalchemy import select, or_
 
 from src.db import Station, Service, StationService, Fuel, StationFuel
+from src.modules import StationsSnapshot, StationsGeoIndex, FuelPriceIndex, DataVersionWatcher
+from src.modules.cache import station_info_cache, service_id_cache, fuel_id_cache
+from src.modules.repositories import SyncStateRepository
 
 __all__ = (
     'StationsView',
@@ -12,20 +15,58 @@ __all__ = (
 )
 
 
-class StationsView(ModelView, model=Station):
+class InvalidateSnapshotMixin:
+    """
+    Сбрасывает снимок списка станций и кеш ответов по станциям после изменения или удаления записи через админку.
+    Версия данных увеличивается, а журнал изменений очищается: клиенты получат полный список станций.
+    """
+
+    async def after_model_change(self, data: dict, model, is_created: bool) -> None:
+        await self.invalidate_cached_data()
+
+    async def after_model_delete(self, model) -> None:
+        await self.invalidate_cached_data()
+
+    @staticmethod
+    async def invalidate_cached_data() -> None:
+        version = await SyncStateRepository.reset_change_log()
+        StationsSnapshot().invalidate()
+        # Название и иконка услуги или топлива входят в ответы многих станций, поэтому кеш очищается целиком
+        station_info_cache.clear()
+        FuelPriceIndex().invalidate()
+        DataVersionWatcher().advance(version)
+
+
+class StationsView(InvalidateSnapshotMixin, ModelView, model=Station):
     column_list = [Station.external_id, Station.number, Station.address, Station.latitude, Station.longitude,
                    Station.created_at]
     column_searchable_list = [Station.address, Station.number]
     page_size = 50
 
+    async def after_model_change(self, data: dict, model, is_created: bool) -> None:
+        await super().after_model_change(data, model, is_created)
+        StationsGeoIndex().invalidate()
+
+    async def after_model_delete(self, model) -> None:
+        await super().after_model_delete(model)
+        StationsGeoIndex().invalidate()
 
-class ServicesView(ModelView, model=Service):
+
+class ServicesView(InvalidateSnapshotMixin, ModelView, model=Service):
     column_list = [Service.title, Service.title_for_user, Service.img_url, Service.created_at]
     column_searchable_list = [Service.title]
     page_size = 50
 
+    async def after_model_change(self, data: dict, model, is_created: bool) -> None:
+        await super().after_model_change(data, model, is_created)
+        service_id_cache.clear()
+
+    async def after_model_delete(self, model) -> None:
+        await super().after_model_delete(model)
+        service_id_cache.clear()
+
 
-class StationServicesView(ModelView, model=StationService):
+class StationServicesView(InvalidateSnapshotMixin, ModelView, model=StationService):
     column_list = [StationService.station, StationService.service]
     column_searchable_list = [StationService.station]
     page_size = 50
@@ -35,11 +76,19 @@ class StationServicesView(ModelView, model=StationService):
             .where(or_(Station.number.like(f"%{term}%"), Station.address.like(f"%{term}%")))
 
 
-class FuelsView(ModelView, model=Fuel):
+class FuelsView(InvalidateSnapshotMixin, ModelView, model=Fuel):
     column_list = [Fuel.title, Fuel.title_for_user, Fuel.img_url, Fuel.created_at]
 
+    async def after_model_change(self, data: dict, model, is_created: bool) -> None:
+        await super().after_model_change(data, model, is_created)
+        fuel_id_cache.clear()
+
+    async def after_model_delete(self, model) -> None:
+        await super().after_model_delete(model)
+        fuel_id_cache.clear()
+
 
-class StationFuelsView(ModelView, model=StationFuel):
+class StationFuelsView(InvalidateSnapshotMixin, ModelView, model=StationFuel):
     column_list = [StationFuel.station, StationFuel.fuel, StationFuel.cost, StationFuel.currency,
                    StationFuel.created_at]
     column_searchable_list = [StationFuel.station]
@@ -1,13 +1,20 @@
 import logging
+import time
+from typing import Optional
 
-from fastapi import FastAPI
-from starlette.responses import JSONResponse
+from fastapi import FastAPI, Query, Header, Request
+from starlette.responses import JSONResponse, Response
 
 from src.admin import AdminManager
-from src.db import engine
-from src.helpers import ApiAnswer, BadRequest
-from src.modules import SourceHandler, Stations
-from src.schedule import schedule
+from src.db import engine, migrate, track_queries
+from src.helpers import ApiAnswer, BadRequest, sampled_profile
+from src.modules import (SourceHandler, Stations, StationsSnapshot, StationsGeoIndex, ChangeFeed, FuelPriceIndex,
+                         SyncLeader, DataVersionWatcher, ServiceHealth)
+from src.modules.cache import station_info_cache
+from src.modules.metrics import REQUEST_LATENCY, render_metrics
+from src.schedule import SourceScheduler
+from src.settings import (GEO_SEARCH_MAX_RADIUS, GEO_SEARCH_MAX_LIMIT, STATIONS_PAGE_MAX_LIMIT, QUERY_STATS_ENABLED,
+                          QUERY_STATS_MAX_QUERIES, QUERY_STATS_MAX_DB_TIME, PROFILE_SAMPLE_RATE, PROFILE_DIR)
 
 app = FastAPI()
 
@@ -18,32 +25,204 @@ admin.reg_views()
 LOGGER = logging.getLogger('main')
 
 
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    start_time = time.perf_counter()
+    response = await call_next(request)
+    # Шаблон пути маршрута (/fuels/{title}/cheapest), а не сам путь, чтобы не плодить метки
+    route = request.scope.get("route")
+    REQUEST_LATENCY.observe(time.perf_counter() - start_time, method=request.method,
+                            path=route.path if route is not None else 'other', status=response.status_code)
+    return response
+
+
+@app.middleware("http")
+async def track_request_queries(request: Request, call_next):
+    """
+    Если включено QUERY_STATS_ENABLED - посчитать запросы к БД и время в БД, вернуть их в заголовках
+    X-DB-Queries/X-DB-Time-Ms и записать в лог запросы, превысившие пороги.
+    С вероятностью PROFILE_SAMPLE_RATE сохранить профиль запроса в PROFILE_DIR.
+    """
+    if not QUERY_STATS_ENABLED and PROFILE_SAMPLE_RATE <= 0:
+        return await call_next(request)
+    with sampled_profile(request.url.path, PROFILE_SAMPLE_RATE, PROFILE_DIR) as profile_path:
+        with track_queries() as stats:
+            response = await call_next(request)
+    if profile_path:
+        LOGGER.info(f"Профиль запроса {request.method} {request.url.path} сохранен в {profile_path}")
+    if QUERY_STATS_ENABLED:
+        response.headers['X-DB-Queries'] = str(stats.count)
+        response.headers['X-DB-Time-Ms'] = f"{stats.duration * 1000:.2f}"
+        if stats.count > QUERY_STATS_MAX_QUERIES or stats.duration > QUERY_STATS_MAX_DB_TIME:
+            LOGGER.warning(f"Запрос {request.method} {request.url} выполнил {stats.count} запросов к БД "
+                           f"за {stats.duration:.3f}s")
+    return response
+
+
 @app.on_event("startup")
 async def startup():
     LOGGER.info('START APP')
-    source_handler = SourceHandler()
-    try:
-        await source_handler.check_source_1_for_updates()
-        await source_handler.check_source_2_for_updates()
-    except BadRequest as e:
-        LOGGER.error(str(e))
+    # Обычно это одна проверка таблицы schema_migrations, схема нужна до приема запросов
+    migrate(engine)
+    # Запросы обслуживаются сразу по данным, уже сохраненным в БД: снимок собирается в фоне,
+    # первая синхронизация с источниками - внеочередной запуск задач планировщика
+    ServiceHealth().warm_up()
+    # При нескольких воркерах источники опрашивает только ведущий процесс, остальные следят за версией данных
+    leader = SyncLeader()
+    await leader.acquire()
+    leader.start()
+    await DataVersionWatcher().start()
+
+    scheduler = SourceScheduler()
+    scheduler.start()
+    if leader.is_leader:
+        for source_id in scheduler.intervals:
+            scheduler.sync_now(source_id)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    SourceScheduler().shutdown()
+    DataVersionWatcher().stop()
+    await SyncLeader().stop()
+    await SourceHandler().close()
+
+
+@app.get("/health/live", tags=["service"])
+async def get_liveness():
+    """
+    Проверка, что процесс запущен и отвечает. Не обращается к БД.
+    """
+    return ApiAnswer.response(data=ServiceHealth().get_liveness())
 
-    schedule(source_handler)
+
+@app.get("/health/ready", tags=["service"])
+async def get_readiness():
+    """
+    Проверка готовности отдавать данные: собран непустой снимок списка станций.
+    В ответе версия данных, время и возраст (секунды) их последнего изменения. Если сервис не готов - статус 503.
+    """
+    is_ready, data = await ServiceHealth().get_readiness()
+    if not is_ready:
+        return ApiAnswer.response(error="Сервис не готов", status_code=503, data=data)
+    return ApiAnswer.response(data=data)
 
 
 @app.get("/get_all_stations_info", tags=["stations"])
-async def get_all_stations_info():
+async def get_all_stations_info(cursor: Optional[int] = None,
+                                limit: Optional[int] = Query(None, gt=0, le=STATIONS_PAGE_MAX_LIMIT),
+                                fields: Optional[str] = None,
+                                accept_encoding: Optional[str] = Header(None)):
     """
     Получить список всех станций из объединенных источников.
+
+    - cursor, limit: постраничная выдача по возрастанию id, cursor следующей страницы возвращается в next_cursor;
+    - fields: только перечисленные поля через запятую, например id,latitude,longitude,fuels.
+
+    Полный список возвращается с версией данных в заголовке X-Data-Version, ее можно передать в since
+    запроса /stations/changes.
     """
-    data = await Stations.get_all_stations_info()
-    return ApiAnswer.response(data=data)
+    if cursor is None and limit is None and fields is None:
+        snapshot = StationsSnapshot()
+        body = await snapshot.get()
+        return ApiAnswer.raw_response(body, accept_encoding=accept_encoding,
+                                      headers={'X-Data-Version': str(snapshot.version)})
+    try:
+        fields_list = Stations.parse_fields(fields)
+    except BadRequest as e:
+        return ApiAnswer.response(error=str(e), status_code=e.status_code)
+    data, next_cursor = await Stations.get_stations_page(fields_list, cursor, limit)
+    return ApiAnswer.response(data=data, extra=dict(next_cursor=next_cursor))
 
 
 @app.get("/get_station_info", tags=["stations"])
-async def get_station_info(station_id: int):
+async def get_station_info(station_id: int, accept_encoding: Optional[str] = Header(None)):
     """
     Получить данные о станции по его id.
     """
-    data = await Stations.get_station_info(station_id)
+    try:
+        return ApiAnswer.raw_response(await Stations.get_station_info_body(station_id),
+                                      accept_encoding=accept_encoding)
+    except BadRequest as e:
+        return ApiAnswer.response(error=str(e), status_code=e.status_code)
+
+
+@app.get("/stations/nearby", tags=["stations"])
+async def get_nearby_stations(lat: float = Query(ge=-90, le=90),
+                              lon: float = Query(ge=-180, le=180),
+                              radius: float = Query(10, gt=0, le=GEO_SEARCH_MAX_RADIUS),
+                              limit: int = Query(10, gt=0, le=GEO_SEARCH_MAX_LIMIT)):
+    """
+    Получить ближайшие к точке станции в радиусе radius км, отсортированные по расстоянию.
+    """
+    data = await StationsGeoIndex().get_nearby_stations(lat, lon, radius, limit)
+    return ApiAnswer.response(data=data)
+
+
+@app.get("/fuels/{title}/cheapest", tags=["fuels"])
+async def get_cheapest_fuel_stations(title: str,
+                                     lat: Optional[float] = Query(None, ge=-90, le=90),
+                                     lon: Optional[float] = Query(None, ge=-180, le=180),
+                                     radius: float = Query(10, gt=0, le=GEO_SEARCH_MAX_RADIUS),
+                                     limit: int = Query(10, gt=0, le=GEO_SEARCH_MAX_LIMIT),
+                                     currency: Optional[str] = None):
+    """
+    Получить станции с самой низкой ценой на топливо title (название из источника или для пользователей).
+    Если переданы lat и lon, поиск только среди станций в радиусе radius км от точки.
+    """
+    if (lat is None) != (lon is None):
+        return ApiAnswer.response(error="Координаты lat и lon передаются вместе", status_code=400)
+    data = await FuelPriceIndex().get_cheapest_stations(title, limit, currency, lat, lon, radius)
+    if data is None:
+        return ApiAnswer.response(error=f"Топливо {title} не найдено", status_code=404)
     return ApiAnswer.response(data=data)
+
+
+@app.get("/stations/changes", tags=["stations"])
+async def get_stations_changes(since: int = Query(ge=0)):
+    """
+    Получить станции, изменившиеся после версии данных since.
+    Текущая версия возвращается в version, ее нужно передать в since при следующем запросе.
+    Если изменения за эти версии уже не хранятся, full=true и в stations полный список станций.
+    """
+    data = await ChangeFeed.get_changes(since)
+    return ApiAnswer.response(data=data)
+
+
+@app.get("/sources/status", tags=["sources"])
+async def get_sources_status():
+    """
+    Получить состояние опроса источников: время последнего успешного запроса и обновления данных,
+    задержку ответа, последнюю ошибку, состояние автомата защиты, текущий интервал и время следующего опроса.
+    """
+    return ApiAnswer.response(data=SourceHandler().get_sources_state())
+
+
+@app.post("/sources/{source_id}/sync", tags=["sources"])
+async def sync_source(source_id: int):
+    """
+    Запустить проверку источника сейчас, не дожидаясь расписания.
+    """
+    if source_id not in SourceHandler().sources_state:
+        return ApiAnswer.response(error=f"Источник {source_id} не найден", status_code=404)
+    if not SyncLeader().is_leader:
+        return ApiAnswer.response(error="Синхронизацию выполняет другой процесс", status_code=409)
+    if not SourceScheduler().sync_now(source_id):
+        return ApiAnswer.response(error="Планировщик не запущен", status_code=503)
+    return ApiAnswer.response(data=dict(source_id=source_id), status_code=202)
+
+
+@app.get("/cache/status", tags=["service"])
+async def get_cache_status():
+    """
+    Получить размер и статистику попаданий кеша ответов по отдельным станциям.
+    """
+    return ApiAnswer.response(data=dict(station_info=station_info_cache.stats()))
+
+
+@app.get("/metrics", tags=["service"])
+async def get_metrics():
+    """
+    Метрики сервиса в текстовом формате Prometheus.
+    """
+    return Response(content=await render_metrics(), media_type="text/plain; version=0.0.4")
@@ -1,2 +1,5 @@
 from .models import *
-from .core import engine
+from .core import engine, read_engine, state_engine
+from .migrations import migrate
+from .executor import db_executor, run_in_db_executor
+from .query_stats import QueryStats, track_queries
@@ -0,0 +1,30 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from src.settings import DB_EXECUTOR_WORKERS
+
+__all__ = (
+    'db_executor',
+    'run_in_db_executor',
+)
+
+# Отдельный ограниченный пул потоков для работы с БД, чтобы синхронные запросы SQLAlchemy
+# не блокировали event loop и не занимали общий пул потоков по умолчанию
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+
+def run_in_db_executor(func):
+    """
+    Декоратор: превращает синхронную функцию работы с БД в корутину, выполняемую в пуле db_executor.
+    Контекст (contextvars) вызывающей задачи передается в поток, как в asyncio.to_thread.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,103 @@
+import logging
+import time
+from typing import Callable, List, Tuple
+
+from sqlalchemy import select, insert, func
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError, IntegrityError
+
+from .models import Base, Station, StationService, StationFuel, SchemaMigration, SyncLease, SyncState, StationChange
+
+__all__ = (
+    'migrate',
+    'MIGRATIONS',
+)
+
+LOGGER = logging.getLogger('main')
+
+
+def create_tables(connection: Connection) -> None:
+    """
+    Создать таблицы, которых еще нет в БД.
+    :param connection: Соединение с открытой транзакцией
+    """
+    Base.metadata.create_all(connection)
+
+
+def create_lookup_indexes(connection: Connection) -> None:
+    """
+    Создать индексы для выборок по станции и по хэшу цен.
+    :param connection: Соединение с открытой транзакцией
+    """
+    # Индексы объявлены в моделях (index=True), в уже существующих таблицах их нужно создать отдельно
+    for index in (*StationService.__table__.indexes, *StationFuel.__table__.indexes, *Station.__table__.indexes):
+        index.create(connection, checkfirst=True)
+
+
+def create_sync_leases(connection: Connection) -> None:
+    """
+    Создать таблицу аренды роли ведущего процесса синхронизации.
+    :param connection: Соединение с открытой транзакцией
+    """
+    SyncLease.__table__.create(connection, checkfirst=True)
+
+
+def set_change_log_start(connection: Connection) -> None:
+    """
+    Записать начало журнала изменений в БД, где версии данных уже ведутся, а начало журнала не записано.
+    Начало журнала - первая версия в журнале: станции, сохраненные до нее, в журнал не попали.
+    :param connection: Соединение с открытой транзакцией
+    """
+    # Ключи sync_state, см. src.modules.repositories
+    values = dict(connection.execute(select(SyncState.key, SyncState.value).where(
+        SyncState.key.in_(['data_version', 'change_log_start_version']))).fetchall())
+    if 'change_log_start_version' in values or 'data_version' not in values:
+        return
+    log_start = connection.execute(select(func.min(StationChange.version))).scalar()
+    connection.execute(insert(SyncState).values(key='change_log_start_version',
+                                                value=str(log_start if log_start is not None
+                                                          else values['data_version'])))
+
+
+# Количество попыток применить миграции, если их одновременно применяет другой процесс (несколько воркеров)
+MIGRATE_ATTEMPTS = 5
+
+# Шаги миграций по порядку: (версия, описание, функция). Новые шаги добавляются только в конец.
+# Шаги должны быть идемпотентны (checkfirst и т.п.): при одновременном запуске процессов шаг может быть повторен
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, 'Создание таблиц', create_tables),
+    (2, 'Индексы для поиска по station_services.station_id, station_fuels.station_id, stations.fuel_data_hash',
+     create_lookup_indexes),
+    (3, 'Таблица sync_leases для выбора процесса, выполняющего синхронизацию', create_sync_leases),
+    (4, 'Начало журнала изменений для БД с данными, сохраненными до версий данных', set_change_log_start),
+]
+
+
+def migrate(engine: Engine) -> None:
+    """
+    Применить к БД шаги миграций, которые еще не были применены. Каждый шаг выполняется в своей транзакции.
+    Если миграции одновременно применяет другой процесс, шаги повторяются после паузы.
+    :param engine: Engine БД
+    """
+    for attempt in range(1, MIGRATE_ATTEMPTS + 1):
+        try:
+            _apply_migrations(engine)
+            return
+        except (OperationalError, IntegrityError) as e:
+            if attempt == MIGRATE_ATTEMPTS:
+                raise
+            LOGGER.warning(f"Миграции применяются другим процессом ({e.orig}), повтор {attempt}/{MIGRATE_ATTEMPTS}")
+            time.sleep(0.5 * attempt)
+
+
+def _apply_migrations(engine: Engine) -> None:
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    with engine.connect() as connection:
+        applied = set(connection.execute(select(SchemaMigration.version)).scalars())
+    for version, title, step in MIGRATIONS:
+        if version in applied:
+            continue
+        LOGGER.info(f"Применение миграции {version} - {title}")
+        with engine.begin() as connection:
+            step(connection)
+            connection.execute(insert(SchemaMigration).values(version=version, title=title))
@@ -1,2 +1,3 @@
 from .services import Base, Service, StationService, Fuel, StationFuel
 from .stations import Base, Station
+from .sync import Base, SyncState, StationChange, SchemaMigration, SyncLease
@@ -26,7 +26,7 @@ class Service(Base):
 class StationService(Base):
     __tablename__ = "station_services"
 
-    station_id = Column(Integer(), ForeignKey("stations.external_id"), nullable=False)
+    station_id = Column(Integer(), ForeignKey("stations.external_id"), nullable=False, index=True)
     service_id = Column(Integer(), ForeignKey("services.id"), nullable=False)
 
     station = relationship("Station", foreign_keys=[station_id])
@@ -48,7 +48,7 @@ class Fuel(Base):
 class StationFuel(Base):
     __tablename__ = "station_fuels"
 
-    station_id = Column(String(), ForeignKey("stations.external_id"), nullable=False)
+    station_id = Column(String(), ForeignKey("stations.external_id"), nullable=False, index=True)
     fuel_id = Column(String(), ForeignKey("fuels.id"), nullable=False)
     cost = Column(Float())
     currency = Column(String(25))
@@ -18,7 +18,7 @@ class Station(Base):
     latitude = Column(Float())
     longitude = Column(Float())
     main_data_hash = Column(String())  # UUID()
-    fuel_data_hash = Column(String())  # UUID()
+    fuel_data_hash = Column(String(), index=True)  # UUID()
 
     def __str__(self) -> str:
         return f"{self.number} - {self.address}"
@@ -0,0 +1,58 @@
+from sqlalchemy import Column, Integer, String, Float
+
+from src.db.models.base import Base
+
+__all__ = (
+    'Base',
+    'SyncState',
+    'StationChange',
+    'SchemaMigration',
+    'SyncLease',
+)
+
+
+class SyncState(Base):
+    """
+    Служебные значения синхронизации в виде ключ - значение (версия данных и т.п.).
+    """
+    __tablename__ = "sync_state"
+
+    key = Column(String(), unique=True, nullable=False)
+    value = Column(String())
+
+    def __str__(self) -> str:
+        return f"{self.key} = {self.value}"
+
+
+class StationChange(Base):
+    """
+    Журнал изменений: станция station_id изменилась в версии данных version.
+    """
+    __tablename__ = "station_changes"
+
+    version = Column(Integer(), nullable=False, index=True)
+    station_id = Column(Integer(), nullable=False)
+
+
+class SchemaMigration(Base):
+    """
+    Примененные шаги миграций схемы БД.
+    """
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer(), unique=True, nullable=False)
+    title = Column(String())
+
+
+class SyncLease(Base):
+    """
+    Аренда роли: процесс owner выполняет роль name до момента expires_at (unix time), если не продлит аренду.
+    """
+    __tablename__ = "sync_leases"
+
+    name = Column(String(), unique=True, nullable=False)
+    owner = Column(String(), nullable=False)
+    expires_at = Column(Float(), nullable=False)
+
+    def __str__(self) -> str:
+        return f"{self.name} - {self.owner}"
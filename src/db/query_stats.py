@@ -0,0 +1,76 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+__all__ = (
+    'QueryStats',
+    'install_query_stats',
+    'track_queries',
+)
+
+
+class QueryStats:
+    """
+    Количество запросов к БД и суммарное время их выполнения в секундах.
+    Запросы одного HTTP запроса могут выполняться в нескольких потоках db_executor одновременно.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.__lock = threading.Lock()
+
+    def add(self, duration: float) -> None:
+        with self.__lock:
+            self.count += 1
+            self.duration += duration
+
+
+# Статистика текущего HTTP запроса или запуска планировщика. Передается в потоки db_executor вместе с контекстом
+current_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar(
+    'current_query_stats', default=None)
+
+
+def install_query_stats(engine: Engine) -> None:
+    """
+    Подписаться на выполнение запросов engine и учитывать их в статистике текущего контекста (см. track_queries).
+    :param engine: Engine БД
+    """
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start_time'].pop()
+        stats = current_query_stats.get()
+        if stats is not None:
+            stats.add(duration)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        # after_cursor_execute не вызывается при ошибке, время начала запроса нужно убрать
+        start_times = exception_context.connection.info.get('query_start_time') \
+            if exception_context.connection is not None else None
+        if start_times:
+            start_times.pop()
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """
+    Считать запросы к БД, выполненные внутри блока, в том числе в потоках db_executor.
+    :return: QueryStats, заполняемая по мере выполнения запросов
+    """
+    stats = QueryStats()
+    token = current_query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        current_query_stats.reset(token)
@@ -1,3 +1,10 @@
 from .singleton import singleton
 from .exceptions import BadRequest
 from .api_answer import ApiAnswer
+from .circuit_breaker import CircuitBreaker
+from .cache import LRUCache
+from .compression import EncodedBody, choose_encoding
+from .hashing import content_hash, station_main_data_hash, station_fuel_data_hash, combine_hashes
+from .metrics import MetricsRegistry, Counter, Gauge, Histogram
+from .profiling import sampled_profile
+from .adaptive_interval import AdaptiveInterval
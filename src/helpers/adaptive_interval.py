@@ -0,0 +1,63 @@
+import math
+import time
+from typing import Optional
+
+__all__ = (
+    'AdaptiveInterval',
+)
+
+
+class AdaptiveInterval:
+    """
+    Интервал опроса источника, подстраиваемый под наблюдаемую частоту изменения его данных.
+
+    Среднее время между изменениями считается экспоненциальным сглаживанием, интервал опроса - это среднее время,
+    деленное на polls_per_change, в пределах [min_interval, max_interval]. Если данные не меняются дольше среднего
+    времени, оно считается не меньше прошедшего с последнего изменения времени и интервал растет.
+    Первое изменение, замеченное не на первой проверке, дает первую оценку: время от запуска до изменения.
+    Изменение на первой проверке накопилось до запуска, поэтому время между изменениями по нему не оценивается.
+    Пока оценки нет, интервал только увеличивается от начального (по умолчанию - среднего геометрического пределов).
+    """
+    # Вес нового наблюдения в среднем времени между изменениями
+    SMOOTHING = 0.3
+
+    def __init__(self, min_interval: float, max_interval: float, polls_per_change: float,
+                 initial: Optional[float] = None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.polls_per_change = polls_per_change
+        self.interval: float = self.__clamp(initial if initial is not None
+                                            else math.sqrt(min_interval * max_interval))
+        self.change_interval: Optional[float] = None  # среднее время между изменениями в секундах
+        self.last_change_time: Optional[float] = None
+        self.started_at: float = time.monotonic()
+        self.checks: int = 0
+
+    def record(self, changed: bool, now: Optional[float] = None) -> float:
+        """
+        Учесть результат проверки источника и пересчитать интервал.
+        :param changed: Изменились ли данные источника
+        :param now: Время проверки по time.monotonic()
+        :return: Новый интервал опроса в секундах
+        """
+        now = time.monotonic() if now is None else now
+        if changed:
+            if self.last_change_time is not None:
+                gap = now - self.last_change_time
+            else:
+                # Предыдущее изменение было до запуска, поэтому время от запуска - оценка снизу
+                gap = now - self.started_at if self.checks else None
+            if gap is not None:
+                self.change_interval = gap if self.change_interval is None \
+                    else (1 - self.SMOOTHING) * self.change_interval + self.SMOOTHING * gap
+            self.last_change_time = now
+        self.checks += 1
+        elapsed = now - (self.last_change_time if self.last_change_time is not None else self.started_at)
+        estimate = max(self.change_interval or 0, elapsed) / self.polls_per_change
+        if self.change_interval is None:
+            estimate = max(self.interval, estimate)
+        self.interval = self.__clamp(estimate)
+        return self.interval
+
+    def __clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
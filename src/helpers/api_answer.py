@@ -1,18 +1,25 @@
 """Модуль для формирования ответов API"""
+import json
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 
 __all__ = ['ApiAnswer']
 
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, Response
+
+from src.helpers.compression import EncodedBody
+from src.settings import RESPONSE_COMPRESSION_LEVEL, RESPONSE_COMPRESSION_MIN_SIZE
 
 
 class ApiAnswer:
     """Класс для формирования ответов API"""
 
     @staticmethod
-    def response(error: str = "", status_code: int = 200, data=None) -> JSONResponse:
-        """Формирование ответа API, если возникла ошибка, передайте описание в строке error"""
+    def response(error: str = "", status_code: int = 200, data=None, extra: Dict[str, Any] = None) -> JSONResponse:
+        """
+        Формирование ответа API, если возникла ошибка, передайте описание в строке error.
+        Дополнительные ключи верхнего уровня (например, next_cursor) передаются в extra.
+        """
         if error != "":
             answer = dict(
                 status="error",
@@ -25,8 +32,52 @@ class ApiAnswer:
                 status="ok",
                 data=data
             )
+        if extra:
+            answer.update(extra)
 
         return JSONResponse(
             status_code=status_code,
             content=answer
         )
+
+    @staticmethod
+    def render(data=None) -> bytes:
+        """Сериализовать успешный ответ API в байты заранее, в том же виде, что и JSONResponse"""
+        return json.dumps(
+            dict(status="ok", data=data),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+    @staticmethod
+    def render_encoded(data=None) -> EncodedBody:
+        """Сериализовать успешный ответ API и подготовить его к отдаче в сжатом виде (см. ApiAnswer.raw_response)"""
+        return ApiAnswer.encoded(ApiAnswer.render(data))
+
+    @staticmethod
+    def encoded(body: bytes) -> EncodedBody:
+        """Подготовить уже сериализованный ответ API к отдаче в сжатом виде"""
+        return EncodedBody(body, level=RESPONSE_COMPRESSION_LEVEL, min_size=RESPONSE_COMPRESSION_MIN_SIZE)
+
+    @staticmethod
+    def raw_response(content: Union[bytes, EncodedBody], status_code: int = 200,
+                     accept_encoding: Optional[str] = None, headers: Optional[dict] = None) -> Response:
+        """
+        Формирование ответа API из заранее сериализованного тела (см. ApiAnswer.render).
+        Для EncodedBody кодировка выбирается по заголовку Accept-Encoding клиента.
+        :param headers: дополнительные заголовки ответа
+        """
+        headers = dict(headers or {})
+        if isinstance(content, EncodedBody):
+            encoding, content = content.negotiate(accept_encoding)
+            headers['Vary'] = 'Accept-Encoding'
+            if encoding != 'identity':
+                headers['Content-Encoding'] = encoding
+        return Response(
+            status_code=status_code,
+            content=content,
+            headers=headers,
+            media_type=JSONResponse.media_type
+        )
@@ -0,0 +1,90 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+__all__ = (
+    'LRUCache',
+)
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU кеш с ограничением времени жизни записей.
+    Считает попадания и промахи, чтобы можно было подобрать размер.
+
+    pop() и clear() увеличивают поколение ключа. Значение, прочитанное из источника до сброса ключа, не попадет
+    в кеш, если передать в set() поколение, полученное через generation() до чтения.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.__data: OrderedDict = OrderedDict()  # {key: (время записи, значение)}
+        # Поколения ключей, сброшенных через pop() после последнего clear(), и поколение clear()
+        self.__generations: Dict[Hashable, int] = {}
+        self.__clear_generation = 0
+        self.__lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.__lock:
+            item = self.__data.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None:
+                    del self.__data[key]
+                self.misses += 1
+                return None
+            self.__data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def generation(self, key: Hashable) -> Tuple[int, int]:
+        """
+        Получить текущее поколение ключа, его нужно запомнить до чтения значения из источника.
+        """
+        with self.__lock:
+            return self.__clear_generation, self.__generations.get(key, 0)
+
+    def set(self, key: Hashable, value: Any, generation: Optional[Tuple[int, int]] = None) -> bool:
+        """
+        Записать значение в кеш.
+        :param generation: поколение ключа из generation(), если ключ с тех пор сброшен - значение не записывается
+        :return: True, если значение записано
+        """
+        with self.__lock:
+            if generation is not None \
+                    and generation != (self.__clear_generation, self.__generations.get(key, 0)):
+                return False
+            self.__data[key] = (time.monotonic(), value)
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+            return True
+
+    def pop(self, key: Hashable) -> None:
+        with self.__lock:
+            self.__data.pop(key, None)
+            self.__generations[key] = self.__generations.get(key, 0) + 1
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__data.clear()
+            # Поколение clear() входит в поколение каждого ключа, поэтому счетчики ключей можно обнулить
+            self.__clear_generation += 1
+            self.__generations.clear()
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return dict(
+            size=len(self.__data),
+            maxsize=self.maxsize,
+            ttl=self.ttl,
+            hits=self.hits,
+            misses=self.misses,
+            hit_ratio=round(self.hits / requests, 4) if requests else None,
+        )
@@ -0,0 +1,44 @@
+import time
+
+__all__ = (
+    'CircuitBreaker',
+)
+
+
+class CircuitBreaker:
+    """
+    Простой автомат защиты для внешнего сервиса.
+
+    - closed: запросы разрешены, ошибки подряд считаются;
+    - open: после failure_threshold ошибок подряд запросы не выполняются reset_timeout секунд;
+    - half-open: по истечении reset_timeout разрешается пробный запрос, успех закрывает автомат,
+      ошибка снова открывает его.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float = 0
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
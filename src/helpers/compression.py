@@ -0,0 +1,97 @@
+"""Модуль для хранения заранее сжатых копий ответов API"""
+import gzip
+import threading
+import zlib
+from typing import Dict, Optional
+
+__all__ = (
+    'EncodedBody',
+    'choose_encoding',
+    'SUPPORTED_ENCODINGS',
+)
+
+# Поддерживаемые кодировки в порядке предпочтения сервера
+SUPPORTED_ENCODINGS = ('gzip', 'deflate')
+
+
+def _compress(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'gzip':
+        # mtime=0, чтобы одинаковые данные давали одинаковые байты
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == 'deflate':
+        return zlib.compress(body, level)
+    raise ValueError(f"Неподдерживаемая кодировка {encoding}")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> str:
+    """
+    Выбрать кодировку ответа по заголовку Accept-Encoding.
+    :param accept_encoding: значение заголовка, например "gzip, deflate;q=0.5"
+    :return: одна из SUPPORTED_ENCODINGS или 'identity'
+    """
+    if not accept_encoding:
+        return 'identity'
+    weights = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0
+        weights[name.strip().lower()] = weight
+    best, best_weight = 'identity', 0
+    for encoding in SUPPORTED_ENCODINGS:
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class EncodedBody:
+    """
+    Тело ответа и его сжатые копии.
+    Каждая кодировка сжимается один раз при первом запросе и дальше отдается из памяти.
+    """
+
+    def __init__(self, body: bytes, level: int = 6, min_size: int = 0):
+        self.body = body
+        self.level = level
+        self.min_size = min_size
+        self.__encoded: Dict[str, bytes] = {}
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.body)
+
+    def prepare(self, *encodings: str) -> None:
+        """
+        Заранее сжать тело в переданных кодировках.
+        """
+        for encoding in encodings:
+            self.get(encoding)
+
+    def get(self, encoding: str) -> bytes:
+        """
+        Получить тело в кодировке encoding ('identity' - без сжатия).
+        """
+        if encoding == 'identity':
+            return self.body
+        encoded = self.__encoded.get(encoding)
+        if encoded is None:
+            with self.__lock:
+                encoded = self.__encoded.get(encoding)
+                if encoded is None:
+                    encoded = _compress(self.body, encoding, self.level)
+                    self.__encoded[encoding] = encoded
+        return encoded
+
+    def negotiate(self, accept_encoding: Optional[str]) -> tuple:
+        """
+        Выбрать кодировку по заголовку Accept-Encoding.
+        :return: (кодировка, тело в этой кодировке). Маленькие тела не сжимаются
+        """
+        encoding = choose_encoding(accept_encoding) if len(self.body) >= self.min_size else 'identity'
+        return encoding, self.get(encoding)
@@ -0,0 +1,90 @@
+"""Модуль для расчета хешей данных источников, не зависящих от порядка ключей и списков"""
+import hashlib
+import json
+from typing import Any, Dict
+
+__all__ = (
+    'canonical',
+    'content_hash',
+    'station_main_data_hash',
+    'station_fuel_data_hash',
+    'combine_hashes',
+)
+
+# Количество знаков после запятой, до которого округляются числа с плавающей точкой
+FLOAT_PRECISION = 6
+DIGEST_SIZE = 16
+
+# Поля станций, которые попадают в хеш. Остальные поля источника в БД не сохраняются и на хеш не влияют
+MAIN_DATA_FIELDS = ('id', 'number', 'address', 'latitude', 'longitude', 'img_list')
+FUEL_FIELDS = ('title', 'cost', 'currency', 'img')
+
+
+def canonical(value: Any) -> Any:
+    """
+    Привести значение к каноническому виду: 55, 55.0 и 55.0000001 дают одно и то же число, -0.0 равно 0.
+    Округляются только числа с плавающей точкой, целые числа не меняются (без потери точности больших чисел).
+    Словари сериализуются с сортировкой ключей (см. content_hash), порядок списков сохраняется.
+    :param value: Значение из JSON источника
+    :return: Значение, пригодное для json.dumps
+    """
+    if value is None or isinstance(value, (str, bool, int)):
+        return value
+    if isinstance(value, float):
+        value = round(value, FLOAT_PRECISION)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        return {str(key): canonical(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    return str(value)
+
+
+def content_hash(value: Any) -> str:
+    """
+    Получить хеш значения (blake2b) по его канонической JSON записи.
+    :param value: Значение из JSON источника
+    :return: hex строка хеша
+    """
+    return _digest(canonical(value))
+
+
+def _digest(value: Any) -> str:
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(data.encode('utf-8'), digest_size=DIGEST_SIZE).hexdigest()
+
+
+def station_main_data_hash(station: dict) -> str:
+    """
+    Получить хеш основных данных станции из 1 источника. Порядок услуг не влияет на хеш.
+    :param station: Станция из ответа 1 источника
+    :return: hex строка хеша
+    """
+    data = {field: station.get(field) for field in MAIN_DATA_FIELDS}
+    data['additional_services'] = sorted(station.get('additional_services') or [])
+    return content_hash(data)
+
+
+def station_fuel_data_hash(station: dict) -> str:
+    """
+    Получить хеш цен станции из 2 источника. Порядок видов топлива не влияет на хеш.
+    :param station: Станция из ответа 2 источника
+    :return: hex строка хеша
+    """
+    fuels = [canonical({field: _fuel.get(field) for field in FUEL_FIELDS}) for _fuel in station.get('fuel') or []]
+    fuels.sort(key=lambda _fuel: tuple(str(_fuel[field]) for field in FUEL_FIELDS))
+    # Записи топлива уже приведены к каноническому виду, повторно их не обходим
+    return _digest({'id': canonical(station.get('id')), 'fuel': fuels})
+
+
+def combine_hashes(hashes: Dict[Any, str]) -> str:
+    """
+    Получить общий хеш ответа источника из хешей станций. Порядок станций не влияет на хеш.
+    :param hashes: Словарь {id станции: хеш станции}
+    :return: hex строка хеша
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for station_id, station_hash in sorted(hashes.items(), key=lambda item: str(item[0])):
+        digest.update(f"{station_id}:{station_hash};".encode('utf-8'))
+    return digest.hexdigest()
+
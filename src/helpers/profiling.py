@@ -0,0 +1,46 @@
+"""Модуль для сохранения профилей cProfile выборочных запросов"""
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+__all__ = (
+    'sampled_profile',
+)
+
+# cProfile может профилировать только одну задачу потока одновременно, остальные запросы в это время не профилируются
+_profiling_lock = threading.Lock()
+
+
+@contextmanager
+def sampled_profile(name: str, sample_rate: float, directory: str) -> Iterator[Optional[str]]:
+    """
+    С вероятностью sample_rate профилировать блок и сохранить профиль в directory.
+    Профиль сохраняется в формате pstats, его можно открыть snakeviz или перевести во flamegraph (flameprof).
+    Профилируется поток event loop: время запросов в потоках db_executor видно только как ожидание, а задачи,
+    выполнявшиеся в event loop одновременно с блоком, попадают в тот же профиль.
+    :param name: Название профиля, например путь запроса
+    :param sample_rate: Доля профилируемых вызовов от 0 до 1
+    :param directory: Каталог для профилей
+    :return: Путь к файлу профиля или None, если блок не профилируется
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate or not _profiling_lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        file_name = re.sub(r'[^\w.-]+', '_', name).strip('_') or 'root'
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d_%H%M%S')}_{time.time_ns() % 10 ** 9}_{file_name}.prof")
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield path
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    finally:
+        _profiling_lock.release()
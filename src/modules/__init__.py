@@ -1,3 +1,10 @@
 from .data_updater import DataHandler
 from .source_handler import SourceHandler
-from .stations import Stations
+from .stations import Stations, STATION_FIELDS
+from .snapshot import StationsSnapshot
+from .geo_index import StationsGeoIndex
+from .change_feed import ChangeFeed
+from .price_index import FuelPriceIndex
+from .leader import SyncLeader
+from .version_watcher import DataVersionWatcher
+from .health import ServiceHealth
@@ -0,0 +1,96 @@
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, insert
+
+from src.db import Service, Fuel
+from src.helpers import LRUCache
+from src.settings import STATION_CACHE_SIZE, STATION_CACHE_TTL, SYNC_BATCH_SIZE
+
+__all__ = (
+    'station_info_cache',
+    'TitleIdCache',
+    'service_id_cache',
+    'fuel_id_cache',
+)
+
+# Сериализованные ответы /get_station_info по external_id станции.
+# Запись удаляется, когда репозиторий меняет данные станции, и весь кеш очищается при правках в админке
+station_info_cache = LRUCache(maxsize=STATION_CACHE_SIZE, ttl=STATION_CACHE_TTL)
+
+
+class TitleIdCache:
+    """
+    Словарь title -> id справочника (Service, Fuel) в памяти процесса.
+    Загружается из БД целиком при первом обращении и дополняется id созданных записей, поэтому поиск id по названию
+    не требует запросов к БД. Сбрасывается при правке справочника через админку.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.__ids: Optional[Dict[str, int]] = None
+        # Увеличивается при сбросе: словарь, загруженный до сброса, в кеш не сохраняется
+        self.__generation = 0
+        self.__lock = threading.Lock()
+
+    def get_or_create(self, connection, titles: Iterable[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """
+        Получить id записей справочника по названиям, недостающие записи создать в транзакции connection.
+        Созданные записи попадут в кеш только после вызова add(), его нужно вызвать после фиксации транзакции:
+        при откате их id могут достаться другим записям.
+        :param connection: Соединение с открытой транзакцией
+        :param titles: Названия
+        :return: ({название: id} для всех названий, {название: id} созданных записей)
+        """
+        ids = self.__load(connection)
+        titles = set(titles)
+        missing = sorted(title for title in titles if title not in ids)
+        created = {}
+        if missing:
+            # Запись могли создать другой процесс или админка после загрузки кеша
+            found = {}
+            for batch in self.__batches(missing):
+                found.update(connection.execute(
+                    select(self.model.title, self.model.id).where(self.model.title.in_(batch))).fetchall())
+            self.add(found)
+            for batch in self.__batches([title for title in missing if title not in found]):
+                created.update(connection.execute(
+                    insert(self.model).returning(self.model.title, self.model.id),
+                    [dict(title=title, title_for_user=title) for title in batch]
+                ).fetchall())
+            ids = {**ids, **found, **created}
+        return {title: ids[title] for title in titles}, created
+
+    def add(self, ids: Dict[str, int]) -> None:
+        """
+        Добавить в кеш id записей, сохраненных в БД.
+        """
+        if not ids:
+            return
+        with self.__lock:
+            if self.__ids is not None:
+                self.__ids = {**self.__ids, **ids}
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__ids = None
+            self.__generation += 1
+
+    def __load(self, connection) -> Dict[str, int]:
+        with self.__lock:
+            ids, generation = self.__ids, self.__generation
+        if ids is None:
+            ids = dict(connection.execute(select(self.model.title, self.model.id)).fetchall())
+            with self.__lock:
+                if self.__generation == generation:
+                    self.__ids = ids
+        return ids
+
+    @staticmethod
+    def __batches(items: list) -> Iterable[list]:
+        for i in range(0, len(items), SYNC_BATCH_SIZE):
+            yield items[i:i + SYNC_BATCH_SIZE]
+
+
+service_id_cache = TitleIdCache(Service)
+fuel_id_cache = TitleIdCache(Fuel)
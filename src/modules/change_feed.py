@@ -0,0 +1,36 @@
+from src.modules.repositories import SyncStateRepository
+from src.modules.snapshot import StationsSnapshot
+
+__all__ = (
+    'ChangeFeed'
+)
+
+
+class ChangeFeed:
+
+    @staticmethod
+    async def get_changes(since: int) -> dict:
+        """
+        Получить станции, изменившиеся после версии данных since.
+        Если журнал изменений за эти версии уже удален (или версия клиента неизвестна), возвращается полный список.
+        :param since: последняя версия данных, полученная клиентом
+        :return: словарь с ключами:
+         - version: текущая версия данных, ее клиент передает в since в следующий раз;
+         - full: True, если в stations полный список станций;
+         - stations: данные измененных станций;
+         - deleted: id станций, которых больше нет.
+        """
+        snapshot = StationsSnapshot()
+        stations = await snapshot.get_stations()
+        version = snapshot.version
+        station_ids = None
+        if since <= version:
+            station_ids = await SyncStateRepository.get_changes_since(since, version)
+        if station_ids is None:
+            return dict(version=version, full=True, stations=list(stations.values()), deleted=[])
+        return dict(
+            version=version,
+            full=False,
+            stations=[stations[station_id] for station_id in station_ids if station_id in stations],
+            deleted=[station_id for station_id in station_ids if station_id not in stations],
+        )
@@ -0,0 +1,249 @@
+import heapq
+import logging
+import math
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from src.helpers import singleton
+from src.modules.repositories import GasStationRepository
+from src.modules.snapshot import StationsSnapshot
+from src.settings import GEO_INDEX_CELL_SIZE
+
+__all__ = (
+    'StationsGeoIndex',
+    'distance_km',
+)
+
+LOGGER = logging.getLogger('main')
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def distance_km(lat_1: float, lon_1: float, lat_2: float, lon_2: float) -> float:
+    """
+    Расстояние между двумя точками по формуле гаверсинусов, в километрах.
+    """
+    lat_1, lon_1, lat_2, lon_2 = map(math.radians, (lat_1, lon_1, lat_2, lon_2))
+    a = math.sin((lat_2 - lat_1) / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin((lon_2 - lon_1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+@singleton
+class StationsGeoIndex:
+    """
+    Пространственный индекс станций в памяти: равномерная сетка по широте/долготе с ячейкой cell_size градусов.
+    Столбцы сетки замкнуты по долготе: за столбцом у 180° следует столбец у -180°.
+
+    Загружается из БД при первом запросе, далее обновляется точечно через update()/remove(),
+    когда DataHandler или админка меняют координаты станций.
+    """
+
+    def __init__(self, cell_size: float = GEO_INDEX_CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns_count = math.ceil(360 / cell_size)
+        self.cells: Dict[int, Dict[int, Set[int]]] = {}  # {строка: {столбец: {external_id}}}
+        self.coordinates: Dict[int, Tuple[float, float]] = {}  # {external_id: (latitude, longitude)}
+        self.is_loaded: bool = False
+        self.__is_loading: bool = False
+        self.__is_changed_while_loading: bool = False
+
+    def __row(self, latitude: float) -> int:
+        return math.floor(latitude / self.cell_size)
+
+    def __column(self, longitude: float) -> int:
+        # Долгота 180° попадает в последний столбец, как и близкие к ней точки
+        return min(math.floor((longitude + 180) / self.cell_size), self.columns_count - 1)
+
+    def __cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return self.__row(latitude), self.__column((longitude + 180) % 360 - 180)
+
+    async def load(self) -> None:
+        """
+        Построить индекс по всем станциям из БД.
+        """
+        self.__is_loading = True
+        self.__is_changed_while_loading = False
+        try:
+            stations = await GasStationRepository.get_all_stations()
+        finally:
+            self.__is_loading = False
+        self.cells = {}
+        self.coordinates = {}
+        for station in stations:
+            self.__add(station[0], station[4], station[3])
+        # Если во время загрузки станции менялись, загруженные данные могли устареть
+        self.is_loaded = not self.__is_changed_while_loading
+        LOGGER.info(f"Построен пространственный индекс по {len(self.coordinates)} станциям")
+
+    def invalidate(self) -> None:
+        """
+        Пометить индекс устаревшим, он будет построен заново при следующем запросе.
+        """
+        self.is_loaded = False
+        if self.__is_loading:
+            self.__is_changed_while_loading = True
+
+    def __add(self, station_id: int, latitude: float, longitude: float) -> None:
+        if latitude is None or longitude is None:
+            return
+        self.coordinates[station_id] = (latitude, longitude)
+        row, column = self.__cell(latitude, longitude)
+        self.cells.setdefault(row, {}).setdefault(column, set()).add(station_id)
+
+    def remove(self, station_id: int) -> None:
+        """
+        Удалить станцию из индекса.
+        """
+        if self.__is_loading:
+            self.__is_changed_while_loading = True
+        coordinates = self.coordinates.pop(station_id, None)
+        if coordinates:
+            row, column = self.__cell(*coordinates)
+            columns = self.cells[row]
+            columns[column].discard(station_id)
+            if not columns[column]:
+                del columns[column]
+                if not columns:
+                    del self.cells[row]
+
+    def update(self, station_id: int, latitude: float, longitude: float) -> None:
+        """
+        Добавить станцию в индекс или обновить ее координаты.
+        """
+        if self.__is_loading:
+            self.__is_changed_while_loading = True
+        if self.coordinates.get(station_id) == (latitude, longitude):
+            return
+        self.remove(station_id)
+        self.__add(station_id, latitude, longitude)
+
+    def nearest(self, latitude: float, longitude: float, radius: float, limit: int) -> List[Tuple[int, float]]:
+        """
+        Найти ближайшие станции.
+        Строки сетки обходятся по удалению от широты точки, пока строка может содержать станции ближе найденных
+        или пока не выйдет за радиус поиска. В каждой строке просматриваются только столбцы, которые могут
+        содержать точки в пределах радиуса (после заполнения limit - в пределах расстояния до самой дальней из
+        найденных станций).
+        :param latitude: широта точки
+        :param longitude: долгота точки
+        :param radius: радиус поиска, км
+        :param limit: максимальное количество станций
+        :return: список (external_id, расстояние в км), отсортированный по расстоянию
+        """
+        if limit <= 0:
+            return []
+        found = []  # max-heap по расстоянию: (-distance, external_id)
+        for row, row_distance in self.__rows(latitude, radius):
+            search_radius = -found[0][0] if len(found) >= limit else radius
+            # Расстояние до любой точки строки не меньше разницы широт
+            if row_distance > search_radius:
+                break
+            for station_id in self.__row_stations(row, latitude, longitude, search_radius):
+                distance = distance_km(latitude, longitude, *self.coordinates[station_id])
+                if distance > radius:
+                    continue
+                if len(found) < limit:
+                    heapq.heappush(found, (-distance, station_id))
+                elif distance < -found[0][0]:
+                    heapq.heapreplace(found, (-distance, station_id))
+        return sorted(((station_id, -distance) for distance, station_id in found), key=lambda item: item[1])
+
+    def within(self, latitude: float, longitude: float, radius: float) -> List[Tuple[int, float]]:
+        """
+        Найти все станции в радиусе от точки.
+        :param latitude: широта точки
+        :param longitude: долгота точки
+        :param radius: радиус поиска, км
+        :return: список (external_id, расстояние в км), отсортированный по расстоянию
+        """
+        found = []
+        for row, _ in self.__rows(latitude, radius):
+            for station_id in self.__row_stations(row, latitude, longitude, radius):
+                distance = distance_km(latitude, longitude, *self.coordinates[station_id])
+                if distance <= radius:
+                    found.append((station_id, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def __rows(self, latitude: float, radius: float) -> List[Tuple[int, float]]:
+        """
+        Строки сетки, пересекающие полосу широт радиуса поиска.
+        :return: список (строка, расстояние в км от точки до ближайшей широты строки), отсортированный по расстоянию
+        """
+        radius_degrees = radius / KM_PER_DEGREE
+        first = self.__row(max(latitude - radius_degrees, -90))
+        last = self.__row(min(latitude + radius_degrees, 90))
+        rows = []
+        for row in range(first, last + 1):
+            low, high = row * self.cell_size, (row + 1) * self.cell_size
+            gap = 0.0 if low <= latitude <= high else min(abs(latitude - low), abs(latitude - high))
+            rows.append((row, gap * KM_PER_DEGREE))
+        rows.sort(key=lambda item: item[1])
+        return rows
+
+    def __row_stations(self, row: int, latitude: float, longitude: float, radius: float) -> Iterator[int]:
+        """
+        Станции строки сетки в столбцах, которые могут содержать точки в пределах радиуса от точки.
+        """
+        columns = self.cells.get(row)
+        if not columns:
+            return
+        half_width = self.__longitude_half_width(row, latitude, radius)
+        if half_width is None or half_width >= 180:
+            # Строка целиком в радиусе поиска по долготе (рядом с полюсом)
+            for station_ids in columns.values():
+                yield from station_ids
+            return
+        west, east = longitude - half_width, longitude + half_width
+        if west < -180:
+            ranges = [(west + 360, 180), (-180, east)]
+        elif east > 180:
+            ranges = [(west, 180), (-180, east - 360)]
+        else:
+            ranges = [(west, east)]
+        for west, east in ranges:
+            first, last = self.__column(west), self.__column(east)
+            if last - first + 1 > len(columns):
+                for column, station_ids in columns.items():
+                    if first <= column <= last:
+                        yield from station_ids
+            else:
+                for column in range(first, last + 1):
+                    yield from columns.get(column, ())
+
+    def __longitude_half_width(self, row: int, latitude: float, radius: float) -> Optional[float]:
+        """
+        Наибольшая разница долгот (градусы) между точкой и точками строки сетки в пределах радиуса.
+        :return: Разница долгот, None - строку нужно просматривать по всей окружности (радиус захватывает полюс)
+        """
+        angle = radius / EARTH_RADIUS_KM
+        radius_degrees = math.degrees(angle)
+        low = max(row * self.cell_size, latitude - radius_degrees)
+        high = min((row + 1) * self.cell_size, latitude + radius_degrees)
+        if low <= -90 or high >= 90 or angle >= math.pi / 2 or abs(latitude) >= 90:
+            return None
+        lat_0 = math.radians(latitude)
+        # Широта, на которой окружность радиуса поиска дальше всего отходит по долготе
+        tangent = math.degrees(math.asin(max(-1.0, min(1.0, math.sin(lat_0) / math.cos(angle)))))
+        candidates = [low, high] + ([tangent] if low <= tangent <= high else [])
+        cos_delta = min(
+            (math.cos(angle) - math.sin(lat_0) * math.sin(math.radians(lat)))
+            / (math.cos(lat_0) * math.cos(math.radians(lat)))
+            for lat in candidates
+        )
+        if cos_delta <= -1:
+            return None
+        # Небольшой запас на погрешность вычислений с плавающей точкой
+        return math.degrees(math.acos(min(1.0, cos_delta))) + 1e-9
+
+    async def get_nearby_stations(self, latitude: float, longitude: float, radius: float, limit: int) -> List[dict]:
+        """
+        Получить данные ближайших станций.
+        :return: Список данных станций из снимка с расстоянием до точки в поле distance (км)
+        """
+        if not self.is_loaded:
+            await self.load()
+        stations = await StationsSnapshot().get_stations()
+        return [dict(stations[station_id], distance=round(distance, 3))
+                for station_id, distance in self.nearest(latitude, longitude, radius, limit)
+                if station_id in stations]
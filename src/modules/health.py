@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+from src.helpers import singleton
+from src.modules.leader import SyncLeader
+from src.modules.repositories import SyncStateRepository, DATA_VERSION_KEY, DATA_UPDATED_AT_KEY
+from src.modules.snapshot import StationsSnapshot
+
+__all__ = (
+    'ServiceHealth',
+)
+
+LOGGER = logging.getLogger('main')
+
+
+@singleton
+class ServiceHealth:
+    """
+    Состояние запуска сервиса для проверок liveness/readiness.
+    Сервис готов, когда собран непустой снимок списка станций: до первой синхронизации с источниками
+    отдаются данные, уже сохраненные в БД.
+    """
+
+    def __init__(self):
+        self.started_at: datetime = datetime.now()
+        self.__warm_up_task: Optional[asyncio.Task] = None
+
+    def warm_up(self) -> None:
+        """
+        Собрать снимок списка станций в фоне, не задерживая запуск приложения.
+        """
+        if self.__warm_up_task is None:
+            self.__warm_up_task = asyncio.create_task(self.__warm_up())
+
+    async def __warm_up(self) -> None:
+        try:
+            await StationsSnapshot().get()
+        except Exception:
+            LOGGER.exception(f"Ошибка сборки снимка списка станций при запуске")
+
+    def get_liveness(self) -> dict:
+        """
+        Получить состояние процесса без обращения к БД.
+        """
+        return dict(started_at=self.started_at.isoformat(),
+                    uptime=round((datetime.now() - self.started_at).total_seconds(), 1))
+
+    async def get_readiness(self) -> Tuple[bool, dict]:
+        """
+        Проверить готовность сервиса отдавать данные.
+        :return: (готов ли сервис, версия и возраст данных в БД, версия снимка и количество станций в нем)
+        """
+        snapshot = StationsSnapshot()
+        if snapshot.body is not None and not snapshot.stations and not snapshot.is_actual:
+            # В пустую БД данные приходят с первой синхронизацией, после нее снимок можно собрать сразу
+            try:
+                await snapshot.get()
+            except Exception:
+                LOGGER.exception(f"Ошибка сборки снимка списка станций")
+        values = await SyncStateRepository.get_values([DATA_VERSION_KEY, DATA_UPDATED_AT_KEY])
+        updated_at = float(values[DATA_UPDATED_AT_KEY]) if values.get(DATA_UPDATED_AT_KEY) else None
+        is_ready = snapshot.body is not None and bool(snapshot.stations)
+        return is_ready, dict(
+            data_version=int(values.get(DATA_VERSION_KEY) or 0),
+            data_updated_at=datetime.fromtimestamp(updated_at).isoformat() if updated_at else None,
+            data_age=round(time.time() - updated_at, 1) if updated_at else None,
+            snapshot_version=snapshot.version if snapshot.body is not None else None,
+            snapshot_built_at=snapshot.built_at.isoformat() if snapshot.built_at else None,
+            stations=len(snapshot.stations),
+            is_leader=SyncLeader().is_leader,
+        )
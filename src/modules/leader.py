@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Optional
+
+from src.helpers import singleton
+from src.modules.repositories import SyncLeaseRepository
+from src.modules.source_handler import SourceHandler
+from src.settings import LEADER_LEASE_TTL, LEADER_RENEW_INTERVAL
+
+__all__ = (
+    'SyncLeader',
+)
+
+LOGGER = logging.getLogger('main')
+
+# Роль процесса, который опрашивает источники и пишет их данные в БД
+SYNC_ROLE = 'source_sync'
+
+
+@singleton
+class SyncLeader:
+    """
+    Выбор ведущего процесса при запуске нескольких воркеров: источники опрашивает только процесс,
+    который держит аренду роли в таблице sync_leases. Аренда продлевается каждые LEADER_RENEW_INTERVAL секунд,
+    если процесс завершился без освобождения роли, ее получит другой процесс через LEADER_LEASE_TTL секунд.
+    Если продлить аренду не удалось (например, БД занята долгой синхронизацией), процесс остается ведущим,
+    пока не истек срок последней продленной аренды.
+    """
+
+    def __init__(self):
+        self.owner: str = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader: bool = False
+        self.lease_expires_at: float = 0  # срок аренды по time.time(), не позже записанного в БД
+        self.__task: Optional[asyncio.Task] = None
+
+    async def acquire(self) -> bool:
+        """
+        Получить или продлить роль ведущего процесса. При получении роли загружается состояние источников из БД.
+        :return: True, если процесс ведущий
+        """
+        start_time = time.time()
+        try:
+            is_leader = await SyncLeaseRepository.acquire(SYNC_ROLE, self.owner, LEADER_LEASE_TTL)
+        except Exception as e:
+            if self.is_leader and time.time() < self.lease_expires_at:
+                # Другой процесс не получит роль, пока аренда не истекла
+                LOGGER.warning(f"Не удалось продлить роль ведущего процесса {self.owner} - {getattr(e, 'orig', e)}, "
+                               f"аренда действует еще {self.lease_expires_at - time.time():.0f} с")
+                return True
+            LOGGER.exception(f"Ошибка продления роли ведущего процесса {self.owner}")
+            is_leader = False
+        if is_leader:
+            self.lease_expires_at = start_time + LEADER_LEASE_TTL
+        if is_leader != self.is_leader:
+            LOGGER.info(f"Процесс {self.owner} {'стал' if is_leader else 'больше не'} ведущим для синхронизации")
+            if is_leader:
+                # Предыдущий ведущий процесс мог применить более новые ответы источников
+                try:
+                    await SourceHandler().load_state()
+                except Exception:
+                    LOGGER.exception(f"Ошибка загрузки состояния источников")
+        self.is_leader = is_leader
+        return is_leader
+
+    def start(self) -> None:
+        """
+        Запустить периодическое продление роли в фоне.
+        """
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__run())
+
+    async def stop(self) -> None:
+        """
+        Остановить продление роли и освободить ее для других процессов.
+        """
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+        if self.is_leader:
+            self.is_leader = False
+            await SyncLeaseRepository.release(SYNC_ROLE, self.owner)
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(LEADER_RENEW_INTERVAL)
+            await self.acquire()
@@ -0,0 +1,65 @@
+from src.helpers import MetricsRegistry
+from src.modules.cache import station_info_cache
+from src.modules.repositories import SyncStateRepository
+from src.schemas import SyncReport
+
+__all__ = (
+    'registry',
+    'REQUEST_LATENCY',
+    'SOURCE_FETCH_LATENCY',
+    'SOURCE_PAYLOAD_SIZE',
+    'SOURCE_FETCH_ERRORS',
+    'SYNC_PHASE_DURATION',
+    'SYNC_ROWS',
+    'observe_sync_report',
+    'render_metrics',
+)
+
+# Размер ответа источника в байтах: от 1 Кб до 256 Мб
+PAYLOAD_SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(10))
+SYNC_PHASE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+registry = MetricsRegistry()
+
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Время обработки запросов к API', ('method', 'path', 'status'))
+SOURCE_FETCH_LATENCY = registry.histogram(
+    'source_fetch_duration_seconds', 'Время одного запроса к источнику', ('source', 'status'),
+    buckets=SYNC_PHASE_BUCKETS)
+SOURCE_PAYLOAD_SIZE = registry.histogram(
+    'source_payload_size_bytes', 'Размер тела ответа источника', ('source',), buckets=PAYLOAD_SIZE_BUCKETS)
+SOURCE_FETCH_ERRORS = registry.counter(
+    'source_fetch_errors_total', 'Количество неудачных запросов к источнику', ('source',))
+SYNC_PHASE_DURATION = registry.histogram(
+    'sync_phase_duration_seconds', 'Длительность этапов синхронизации: fetch, parse, hash, diff, write',
+    ('source', 'phase'), buckets=SYNC_PHASE_BUCKETS)
+SYNC_ROWS = registry.counter(
+    'sync_rows_total', 'Количество строк, измененных синхронизацией', ('source', 'table', 'operation'))
+DATA_VERSION = registry.gauge('data_version', 'Текущая версия данных')
+CACHE_HIT_RATIO = registry.gauge('cache_hit_ratio', 'Доля попаданий в кеш', ('cache',))
+CACHE_ENTRIES = registry.gauge('cache_entries', 'Количество записей в кеше', ('cache',))
+
+
+def observe_sync_report(source: int, report: SyncReport) -> None:
+    """
+    Добавить в метрики количество строк, измененных синхронизацией.
+    :param source: Номер источника
+    :param report: Отчет синхронизации
+    """
+    for table, stats in report.tables.items():
+        for operation in ('inserted', 'updated', 'deleted'):
+            count = getattr(stats, operation)
+            if count:
+                SYNC_ROWS.inc(count, source=source, table=table, operation=operation)
+
+
+async def render_metrics() -> str:
+    """
+    Обновить значения, которые читаются в момент запроса (версия данных, статистика кешей), и вывести все метрики.
+    :return: Метрики в текстовом формате Prometheus
+    """
+    DATA_VERSION.set(await SyncStateRepository.get_data_version())
+    stats = station_info_cache.stats()
+    CACHE_HIT_RATIO.set(stats['hit_ratio'], cache='station_info')
+    CACHE_ENTRIES.set(stats['size'], cache='station_info')
+    return registry.render()
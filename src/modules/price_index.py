@@ -0,0 +1,179 @@
+import bisect
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.helpers import singleton
+from src.modules.geo_index import StationsGeoIndex
+from src.modules.repositories import GasStationRepository
+from src.modules.snapshot import StationsSnapshot
+
+__all__ = (
+    'FuelPriceIndex',
+)
+
+LOGGER = logging.getLogger('main')
+
+
+@singleton
+class FuelPriceIndex:
+    """
+    Индексы цен в памяти: для каждого вида топлива (Fuel.title) список (цена, external_id станции),
+    отсортированный по возрастанию цены.
+
+    Загружается из БД при первом запросе, далее обновляется по станциям через set_station_prices(),
+    когда DataHandler применяет изменения цен 2 источника. Нулевые цены (нет в продаже) в индекс не попадают.
+    """
+
+    def __init__(self):
+        self.prices: Dict[str, List[Tuple[float, int]]] = defaultdict(list)
+        # {external_id: {Fuel.title: (cost, currency)}}
+        self.stations: Dict[int, Dict[str, Tuple[float, str]]] = defaultdict(dict)
+        self.titles: Dict[str, str] = {}  # {Fuel.title_for_user: Fuel.title}
+        self.user_titles: Dict[str, str] = {}  # {Fuel.title: Fuel.title_for_user}
+        self.is_loaded: bool = False
+        self.__is_loading: bool = False
+        self.__is_changed_while_loading: bool = False
+
+    async def load(self) -> None:
+        """
+        Построить индексы по всем ценам из БД.
+        """
+        self.__is_loading = True
+        self.__is_changed_while_loading = False
+        try:
+            fuels = await GasStationRepository.get_fuels()
+            fuel_prices = await GasStationRepository.get_all_station_fuel_prices()
+        finally:
+            self.__is_loading = False
+        self.prices = defaultdict(list)
+        self.stations = defaultdict(dict)
+        self.titles = {_fuel[2] or _fuel[1]: _fuel[1] for _fuel in fuels}
+        self.user_titles = {_fuel[1]: _fuel[2] or _fuel[1] for _fuel in fuels}
+        for station_id, title, cost, currency in fuel_prices:
+            self.stations[int(station_id)][title] = (cost, currency)
+            if cost and cost > 0:
+                self.prices[title].append((cost, int(station_id)))
+        for title_prices in self.prices.values():
+            title_prices.sort()
+        self.is_loaded = not self.__is_changed_while_loading
+        LOGGER.info(f"Построены индексы цен по {len(self.prices)} видам топлива")
+
+    def invalidate(self) -> None:
+        """
+        Пометить индексы устаревшими, они будут построены заново при следующем запросе.
+        """
+        self.is_loaded = False
+        if self.__is_loading:
+            self.__is_changed_while_loading = True
+
+    def set_station_prices(self, station_id: int, fuels: Iterable[Tuple[str, float, str]]) -> None:
+        """
+        Заменить цены станции в индексах.
+        :param station_id: external_id станции
+        :param fuels: актуальный список топлива станции (Fuel.title, cost, currency)
+        """
+        if self.__is_loading:
+            self.__is_changed_while_loading = True
+        new_prices = {title: (cost, currency) for title, cost, currency in fuels}
+        old_prices = self.stations.get(station_id, {})
+        for title, (cost, currency) in old_prices.items():
+            if new_prices.get(title, (None, None))[0] != cost:
+                self.__remove(title, cost, station_id)
+        for title, (cost, currency) in new_prices.items():
+            self.titles.setdefault(title, title)
+            if old_prices.get(title, (None, None))[0] != cost and cost and cost > 0:
+                bisect.insort(self.prices[title], (cost, station_id))
+        if new_prices:
+            self.stations[station_id] = new_prices
+        else:
+            self.stations.pop(station_id, None)
+
+    async def update_stations(self, station_ids: List[int]) -> None:
+        """
+        Перечитать из БД цены станций, измененных другим процессом, и заменить их в индексах.
+        Если индексы еще не построены, они будут построены при следующем запросе.
+        """
+        if not self.is_loaded or not station_ids:
+            return
+        fuels = defaultdict(list)
+        for station_id, title, cost, currency in await GasStationRepository.get_all_station_fuel_prices(station_ids):
+            fuels[int(station_id)].append((title, cost, currency))
+        for station_id in station_ids:
+            self.set_station_prices(station_id, fuels.get(station_id, []))
+
+    def __remove(self, title: str, cost: float, station_id: int) -> None:
+        title_prices = self.prices.get(title)
+        if not title_prices or not cost or cost <= 0:
+            return
+        i = bisect.bisect_left(title_prices, (cost, station_id))
+        if i < len(title_prices) and title_prices[i] == (cost, station_id):
+            del title_prices[i]
+
+    def resolve_title(self, title: str) -> Optional[str]:
+        """
+        Получить Fuel.title по названию топлива из источника или названию для пользователей.
+        """
+        if title in self.prices or title in self.titles.values():
+            return title
+        return self.titles.get(title)
+
+    def cheapest(self, title: str, limit: int, currency: Optional[str] = None,
+                 station_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, float, str]]:
+        """
+        Найти станции с самой низкой ценой на топливо.
+        :param title: Fuel.title
+        :param limit: максимальное количество станций
+        :param currency: если передан, только цены в этой валюте
+        :param station_ids: если передан, поиск только среди этих станций
+        :return: список (external_id, cost, currency), отсортированный по цене
+        """
+        result = []
+        if station_ids is not None:
+            # Кандидатов немного (станции в радиусе), сортируем их цены напрямую
+            for station_id in station_ids:
+                price = self.stations.get(station_id, {}).get(title)
+                if price and price[0] and price[0] > 0 and (currency is None or price[1] == currency):
+                    result.append((station_id, price[0], price[1]))
+            result.sort(key=lambda item: (item[1], item[0]))
+            return result[:limit]
+        for cost, station_id in self.prices.get(title, ()):
+            station_currency = self.stations[station_id][title][1]
+            if currency is None or station_currency == currency:
+                result.append((station_id, cost, station_currency))
+                if len(result) >= limit:
+                    break
+        return result
+
+    async def get_cheapest_stations(self, title: str, limit: int, currency: Optional[str] = None,
+                                    latitude: Optional[float] = None, longitude: Optional[float] = None,
+                                    radius: Optional[float] = None) -> Optional[List[dict]]:
+        """
+        Получить данные станций с самой низкой ценой на топливо, при переданных координатах - в радиусе от точки.
+        :return: Список данных станций из снимка с ценой в поле fuel и расстоянием в поле distance (км),
+        None - если такого топлива нет
+        """
+        if not self.is_loaded:
+            await self.load()
+        fuel_title = self.resolve_title(title)
+        if fuel_title is None:
+            return None
+        distances = {}
+        station_ids = None
+        if latitude is not None and longitude is not None:
+            geo_index = StationsGeoIndex()
+            if not geo_index.is_loaded:
+                await geo_index.load()
+            distances = dict(geo_index.within(latitude, longitude, radius))
+            station_ids = distances.keys()
+        stations = await StationsSnapshot().get_stations()
+        user_title = self.user_titles.get(fuel_title, fuel_title)
+        result = []
+        for station_id, cost, currency in self.cheapest(fuel_title, limit, currency, station_ids):
+            if station_id not in stations:
+                continue
+            station = dict(stations[station_id], fuel=dict(title=user_title, cost=cost, currency=currency))
+            if station_id in distances:
+                station['distance'] = round(distances[station_id], 3)
+            result.append(station)
+        return result
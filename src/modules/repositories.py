@@ -1,42 +1,139 @@
 import logging
+import time
+from typing import Dict, Iterator, List, Optional
 
-from sqlalchemy import select, update, insert, delete
+from sqlalchemy import select, update, insert, delete, bindparam, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from src.db import engine, Station, StationService, Service, Fuel, StationFuel
-from src.schemas import GasStationMainData, GasStationFuelData, FuelData
+from src.db import (engine, read_engine, state_engine, run_in_db_executor, Station, StationService, Service, Fuel,
+                    StationFuel, SyncState, StationChange, SyncLease)
+from src.modules.cache import station_info_cache, service_id_cache, fuel_id_cache
+from src.schemas import GasStationMainData, GasStationFuelData, SyncReport
+from src.settings import SYNC_BATCH_SIZE, CHANGE_LOG_MAX_VERSIONS
 
 __all__ = (
-    'GasStationRepository'
+    'GasStationRepository',
+    'SyncStateRepository',
+    'SyncLeaseRepository',
+    'STATION_FIELDS_COLUMNS',
+    'DATA_VERSION_KEY',
+    'DATA_UPDATED_AT_KEY',
+    'SOURCE_FINGERPRINT_KEY',
+    'SOURCE_VALIDATORS_KEY',
 )
 
 LOGGER = logging.getLogger('main')
 
+# Поля станции в ответе API и соответствующие им колонки таблицы stations
+STATION_FIELDS_COLUMNS = {
+    'number': Station.number,
+    'address': Station.address,
+    'latitude': Station.latitude,
+    'longitude': Station.longitude,
+}
+
+
+def batches(items: list, batch_size: int) -> Iterator[list]:
+    """
+    Разбить список на пачки размером batch_size.
+    """
+    for i in range(0, len(items), batch_size):
+        yield items[i:i + batch_size]
+
+
+# Ключи таблицы sync_state
+DATA_VERSION_KEY = 'data_version'
+# Версия, начиная с которой журнал изменений полный: изменения после нее можно отдать клиенту из журнала.
+# Первая записанная версия: данные, сохраненные до нее, в журнал не попали
+CHANGE_LOG_START_KEY = 'change_log_start_version'
+# Время последнего изменения данных (unix time)
+DATA_UPDATED_AT_KEY = 'data_updated_at'
+# Отпечаток последнего примененного ответа источника и его ETag/Last-Modified (json), {} - номер источника
+SOURCE_FINGERPRINT_KEY = 'source_{}_fingerprint'
+SOURCE_VALIDATORS_KEY = 'source_{}_validators'
+
+
+def get_state_value(connection, key: str) -> Optional[str]:
+    """
+    Получить значение из sync_state в рамках открытого соединения.
+    """
+    return connection.execute(select(SyncState.value).where(SyncState.key == key)).scalar()
+
+
+def set_state_value(connection, key: str, value: str) -> None:
+    """
+    Записать значение в sync_state в рамках открытого соединения.
+    """
+    res = connection.execute(update(SyncState).where(SyncState.key == key).values(value=value))
+    if not res.rowcount:
+        connection.execute(insert(SyncState).values(key=key, value=value))
+
+
+def record_station_changes(connection, station_ids: List[int]) -> int:
+    """
+    Увеличить версию данных и записать в журнал станции, изменившиеся в ней.
+    Журнал хранит последние CHANGE_LOG_MAX_VERSIONS версий.
+    Вызывается в той же транзакции, в которой меняются данные станций.
+    :return: новая версия данных
+    """
+    version = int(get_state_value(connection, DATA_VERSION_KEY) or 0) + 1
+    for batch in batches(sorted(station_ids), SYNC_BATCH_SIZE):
+        connection.execute(insert(StationChange), [dict(version=version, station_id=station_id)
+                                                   for station_id in batch])
+    set_state_value(connection, DATA_VERSION_KEY, str(version))
+    set_state_value(connection, DATA_UPDATED_AT_KEY, str(time.time()))
+    current_log_start = get_state_value(connection, CHANGE_LOG_START_KEY)
+    log_start = version - CHANGE_LOG_MAX_VERSIONS
+    if current_log_start is None:
+        set_state_value(connection, CHANGE_LOG_START_KEY, str(version))
+    elif log_start > int(current_log_start):
+        connection.execute(delete(StationChange).where(StationChange.version <= log_start))
+        set_state_value(connection, CHANGE_LOG_START_KEY, str(log_start))
+    return version
+
 
 class GasStationRepository:
     """
-    Интерфейс для работы с данными в БД
+    Интерфейс для работы с данными в БД.
+    Методы синхронно работают с engine, но выполняются в пуле потоков db_executor,
+    поэтому снаружи вызываются как корутины и не блокируют event loop.
+    Методы, которые только читают данные, используют пул read_engine, изменяющие - engine.
     """
 
     @staticmethod
-    async def get_all_hash() -> tuple:
+    @run_in_db_executor
+    def get_all_hash() -> tuple:
         """
         Возвращает список станций с хешем.
         :return: Список всех станций с id и хешем для 1 и 2 источника.
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(Station.external_id, Station.main_data_hash))
             return res.fetchall()
 
     @staticmethod
-    async def get_excluded_hash_stations(stations_fuel_hash_list: list) -> tuple:
+    @run_in_db_executor
+    def get_all_fuel_hash() -> tuple:
+        """
+        Возвращает список станций с хешем цен.
+        :return: Список всех станций с id и хешем 2 источника.
+        """
+        with read_engine.connect() as connection:
+            res = connection.execute(
+                select(Station.external_id, Station.fuel_data_hash))
+            return res.fetchall()
+
+    @staticmethod
+    @run_in_db_executor
+    def get_excluded_hash_stations(stations_fuel_hash_list: list) -> tuple:
         """
         Возвращает те станции, хешей которых нет в списке.
         :param stations_fuel_hash_list:
         :return: кортеж из списков с id и hash ([Station.external_id, Station.fuel_data_hash],)
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             with Session(bind=connection) as session:
                 res = connection.execute(
                     select(
@@ -51,31 +148,14 @@ class GasStationRepository:
                 return res.fetchall()
 
     @staticmethod
-    async def update_station_info(_station: GasStationMainData) -> None:
-        """
-        Обновить данные о станции.
-        :param _station: модель GasStationMainData с данными о станции.
-        """
-        with engine.connect() as connection:
-            with Session(bind=connection) as session:
-                stmt = update(Station) \
-                    .where(Station.external_id == _station.external_id) \
-                    .values(number=_station.number,
-                            address=_station.address,
-                            latitude=_station.latitude,
-                            longitude=_station.longitude,
-                            main_data_hash=_station.main_data_hash)
-                session.execute(stmt)
-                session.commit()
-
-    @staticmethod
-    async def get_station_service_info(station_id: int) -> tuple:
+    @run_in_db_executor
+    def get_station_service_info(station_id: int) -> tuple:
         """
         Получить список услуг для станций в бд.
         :param station_id: id станции из источника.
         :return: Кортеж с списком из Service.id и Service.title
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(
                     Service.id,
@@ -87,61 +167,14 @@ class GasStationRepository:
             return res.fetchall()
 
     @staticmethod
-    async def add_service_for_station(station_id: int, service_title: str) -> None:
-        """
-        Добавить услугу для станции.
-        :param station_id: id станции из источника
-        :param service_title: title для услуги
-        """
-        try:
-            LOGGER.info(f"Добавление нового типа услуги - {service_title} для станции {station_id}")
-            with engine.connect() as connection:
-                with Session(bind=connection) as session:
-                    res = session.execute(
-                        select(Service.id).where(Service.title == service_title)
-                    )
-                    rows = res.fetchall()
-                    if not rows:
-                        stmt = insert(Service).values(title=service_title, title_for_user=service_title)
-                        # sqlite не поддерживает returning, поэтому придется еще раз запросить
-                        session.execute(stmt)
-                        session.commit()
-                        new_res = session.execute(
-                            select(Service.id).where(Service.title == service_title)
-                        )
-                        service_id = new_res.fetchall()[0][0]
-                    else:
-                        service_id = rows[0][0]
-                    session.execute(
-                        insert(StationService).values(station_id=station_id, service_id=service_id)
-                    )
-                    session.commit()
-        except Exception as e:
-            LOGGER.error(f"Ошибка при обновлении услуги - {e}")
-
-    @staticmethod
-    async def remove_service_for_station(station_id: int, service_id: int) -> None:
-        """
-        Удалить услугу у станции.
-        :param station_id: external id станции
-        :param service_id: id услуги
-        """
-        LOGGER.info(f"Удаление услуги с id {service_id} для станции {station_id}")
-        with engine.connect() as connection:
-            with Session(bind=connection) as session:
-                stmt = delete(StationService).where(StationService.station_id == station_id,
-                                                    StationService.service_id == service_id)
-                session.execute(stmt)
-                session.commit()
-
-    @staticmethod
-    async def get_station_fuels(station_id: int) -> tuple:
+    @run_in_db_executor
+    def get_station_fuels(station_id: int) -> tuple:
         """
         Получить список топлива для станций в бд.
         :param station_id: id станции из источника.
         :return: Кортеж с списком из Fuel.id, Fuel.title, Fuel.cost, Fuel.currency
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(
                     Fuel.id,
@@ -156,123 +189,13 @@ class GasStationRepository:
             return res.fetchall()
 
     @staticmethod
-    async def update_fuel_cost(station_id: int, fuel_id: int, fuel_cost: float, fuel_currency: str) -> None:
-        """
-        Обновить значение стоимости для топлива в БД
-        :param station_id: external_id станции
-        :param fuel_id: id топлива
-        :param fuel_cost: стоимость
-        :param fuel_currency: валюта
-        :return:
-        """
-        LOGGER.info(f"Обновление стоимости топлива с id {fuel_id} для станции {station_id}")
-        with engine.connect() as connection:
-            with Session(bind=connection) as session:
-                stmt = update(StationFuel) \
-                    .where(StationFuel.fuel_id == fuel_id, StationFuel.station_id == station_id) \
-                    .values(cost=fuel_cost,
-                            currency=fuel_currency)
-                session.execute(stmt)
-                session.commit()
-
-    @staticmethod
-    async def add_fuel_for_station(station_id: int, _fuel: FuelData) -> None:
-        """
-        Добавить топливо для станции.
-        :param station_id: id станции из источника
-        :param _fuel: модель FuelData
-        """
-        try:
-            LOGGER.info(f"Обновление топлива - {_fuel} для станции {station_id}")
-            with engine.connect() as connection:
-                with Session(bind=connection) as session:
-                    res = session.execute(
-                        select(Fuel.id).where(Fuel.title == _fuel.title)
-                    )
-                    rows = res.fetchall()
-                    if not rows:
-                        stmt = insert(Fuel).values(
-                            title=_fuel.title,
-                            title_for_user=_fuel.title
-                        )
-
-                        # sqlite не поддерживает returning, поэтому придется еще раз запросить
-                        connection.execute(stmt)
-                        connection.commit()
-                        new_res = session.execute(
-                            select(Fuel.id).where(Fuel.title == _fuel.title)
-                        )
-                        fuel_id = new_res.fetchall()[0][0]
-                    else:
-                        fuel_id = rows[0][0]
-                    session.execute(
-                        insert(StationFuel).values(station_id=station_id,
-                                                   fuel_id=fuel_id,
-                                                   cost=_fuel.cost,
-                                                   currency=_fuel.currency)
-                    )
-                    session.commit()
-
-        except Exception as e:
-            LOGGER.error(f"Ошибка при обновлении информации о топливе - {e}")
-
-    @staticmethod
-    async def remove_fuel_for_station(station_id: int, fuel_id: int) -> None:
-        """
-        Удалить услугу у станции.
-        :param station_id: id станции
-        :param fuel_id: id топлива
-        """
-        LOGGER.info(f"Удаление информации о топливе с id {fuel_id} для станции {station_id}")
-        with engine.connect() as connection:
-            with Session(bind=connection) as session:
-                stmt = delete(StationFuel).where(StationFuel.station_id == station_id,
-                                                 StationFuel.fuel_id == fuel_id)
-                session.execute(stmt)
-                session.commit()
-
-    @staticmethod
-    async def update_station_fuel_hash_data(station_id: int, hash_data: str) -> None:
-        """
-        Обновить fuel_data_hash для станции
-        :param station_id:
-        :param hash_data:
-        :return:
-        """
-        with engine.connect() as connection:
-            with Session(bind=connection) as session:
-                stmt = update(Station) \
-                    .where(Station.external_id == station_id) \
-                    .values(fuel_data_hash=hash_data)
-                session.execute(stmt)
-                session.commit()
-
-    @staticmethod
-    async def create_station(_station: GasStationMainData) -> None:
-        """
-        Создать объект станции в БД.
-        :param _station: Модель GasStationMainData
-        """
-        LOGGER.info(f"Создание записи для станции - {_station}")
-        with engine.connect() as connection:
-            with Session(bind=connection) as session:
-                stmt = insert(Station).values(
-                    external_id=_station.external_id,
-                    number=_station.number,
-                    address=_station.address,
-                    latitude=_station.latitude,
-                    longitude=_station.longitude,
-                    main_data_hash=_station.main_data_hash)
-                session.execute(stmt)
-                session.commit()
-
-    @staticmethod
-    async def get_all_stations() -> tuple:
+    @run_in_db_executor
+    def get_all_stations() -> tuple:
         """
         Получить все станции из бд.
         :return: Кортеж с external_id, number, address, longitude, latitude
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(Station.external_id,
                        Station.number,
@@ -283,13 +206,14 @@ class GasStationRepository:
             return res.fetchall()
 
     @staticmethod
-    async def get_station_service_for_users(station_id: int) -> tuple:
+    @run_in_db_executor
+    def get_station_service_for_users(station_id: int) -> tuple:
         """
         Получить список услуг для станций в бд.
         :param station_id: id станции из источника.
         :return: Кортеж с списком из Service.id, Service.title_for_user, Service.img_url
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(
                     Service.id,
@@ -302,13 +226,14 @@ class GasStationRepository:
             return res.fetchall()
 
     @staticmethod
-    async def get_station_fuels_for_user(station_id: int) -> tuple:
+    @run_in_db_executor
+    def get_station_fuels_for_user(station_id: int) -> tuple:
         """
         Получить список топлива для станций в бд.
         :param station_id: id станции из источника.
         :return: Кортеж с списком из Fuel.id, Fuel.title_for_user, Fuel.cost, Fuel.currency, Fuel.img_url
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(
                     Fuel.id,
@@ -324,13 +249,123 @@ class GasStationRepository:
             return res.fetchall()
 
     @staticmethod
-    async def get_station(station_id: int) -> tuple:
+    @run_in_db_executor
+    def get_all_station_services_for_users(station_ids: Optional[List[int]] = None) -> tuple:
+        """
+        Получить услуги всех станций одним запросом.
+        :param station_ids: если передан, только для станций из списка
+        :return: Кортеж с списком из StationService.station_id, Service.id, Service.title_for_user, Service.img_url
+        """
+        stmt = select(
+            StationService.station_id,
+            Service.id,
+            Service.title_for_user,
+            Service.img_url
+        ).join(
+            StationService,
+            Service.id == StationService.service_id)
+        with read_engine.connect() as connection:
+            if station_ids is None:
+                return connection.execute(stmt).fetchall()
+            rows = []
+            for batch in batches(station_ids, SYNC_BATCH_SIZE):
+                rows.extend(connection.execute(stmt.where(StationService.station_id.in_(batch))).fetchall())
+            return rows
+
+    @staticmethod
+    @run_in_db_executor
+    def get_all_station_fuels_for_users(station_ids: Optional[List[int]] = None) -> tuple:
+        """
+        Получить топливо всех станций одним запросом.
+        :param station_ids: если передан, только для станций из списка
+        :return: Кортеж с списком из StationFuel.station_id, Fuel.id, Fuel.title_for_user, StationFuel.cost,
+        StationFuel.currency, Fuel.img_url
+        """
+        stmt = select(
+            StationFuel.station_id,
+            Fuel.id,
+            Fuel.title_for_user,
+            StationFuel.cost,
+            StationFuel.currency,
+            Fuel.img_url
+        ).join(
+            StationFuel,
+            Fuel.id == StationFuel.fuel_id
+        )
+        with read_engine.connect() as connection:
+            if station_ids is None:
+                return connection.execute(stmt).fetchall()
+            rows = []
+            for batch in batches(station_ids, SYNC_BATCH_SIZE):
+                rows.extend(connection.execute(stmt.where(StationFuel.station_id.in_(batch))).fetchall())
+            return rows
+
+    @staticmethod
+    @run_in_db_executor
+    def get_all_station_fuel_prices(station_ids: Optional[List[int]] = None) -> tuple:
+        """
+        Получить цены на топливо всех станций одним запросом.
+        :param station_ids: если передан, только для станций из списка
+        :return: Кортеж с списком из StationFuel.station_id, Fuel.title, StationFuel.cost, StationFuel.currency
+        """
+        stmt = select(
+            StationFuel.station_id,
+            Fuel.title,
+            StationFuel.cost,
+            StationFuel.currency
+        ).join(
+            StationFuel,
+            Fuel.id == StationFuel.fuel_id
+        )
+        with read_engine.connect() as connection:
+            if station_ids is None:
+                return connection.execute(stmt).fetchall()
+            rows = []
+            for batch in batches(station_ids, SYNC_BATCH_SIZE):
+                rows.extend(connection.execute(stmt.where(StationFuel.station_id.in_(batch))).fetchall())
+            return rows
+
+    @staticmethod
+    @run_in_db_executor
+    def get_fuels() -> tuple:
+        """
+        Получить все виды топлива.
+        :return: Кортеж с списком из Fuel.id, Fuel.title, Fuel.title_for_user
+        """
+        with read_engine.connect() as connection:
+            res = connection.execute(
+                select(Fuel.id, Fuel.title, Fuel.title_for_user)
+            )
+            return res.fetchall()
+
+    @staticmethod
+    @run_in_db_executor
+    def get_stations_page(fields: List[str], cursor: Optional[int] = None, limit: Optional[int] = None) -> tuple:
+        """
+        Получить станции, отсортированные по external_id, начиная после cursor.
+        :param fields: поля станции из STATION_FIELDS_COLUMNS, которые нужно выбрать
+        :param cursor: external_id, после которого начинается страница
+        :param limit: размер страницы
+        :return: Кортеж с external_id и колонками fields в том же порядке
+        """
+        stmt = select(Station.external_id, *(STATION_FIELDS_COLUMNS[field] for field in fields)) \
+            .order_by(Station.external_id)
+        if cursor is not None:
+            stmt = stmt.where(Station.external_id > cursor)
+        if limit is not None:
+            stmt = stmt.limit(limit)
+        with read_engine.connect() as connection:
+            return connection.execute(stmt).fetchall()
+
+    @staticmethod
+    @run_in_db_executor
+    def get_station(station_id: int) -> tuple:
         """
         Получить все станции из бд.
         :param station_id: id станции из источника.
         :return: Кортеж с external_id, number, address, longitude, latitude
         """
-        with engine.connect() as connection:
+        with read_engine.connect() as connection:
             res = connection.execute(
                 select(
                     Station.external_id,
@@ -341,3 +376,313 @@ class GasStationRepository:
                 ).where(Station.external_id == station_id)
             )
             return res.fetchall()
+
+    @staticmethod
+    @run_in_db_executor
+    def bulk_sync_main_data(stations: Dict[int, GasStationMainData],
+                            batch_size: int = SYNC_BATCH_SIZE) -> SyncReport:
+        """
+        Синхронизировать данные 1 источника одной транзакцией.
+        Станции и их услуги вставляются и обновляются пачками через executemany.
+        :param stations: словарь {external_id: GasStationMainData} только с новыми и измененными станциями источника
+        (отбираются по хешу в DataHandler); станция, которой нет в БД, добавляется, станции не из словаря не меняются
+        :param batch_size: размер пачки строк
+        :return: SyncReport с количеством вставленных/обновленных/удаленных строк по таблицам
+        """
+        report = SyncReport()
+        with engine.begin() as connection:
+            db_hash = dict(connection.execute(select(Station.external_id, Station.main_data_hash)).fetchall())
+            new_stations = [station for station_id, station in stations.items() if station_id not in db_hash]
+            changed_stations = [station for station_id, station in stations.items()
+                                if station_id in db_hash and db_hash[station_id] != station.main_data_hash]
+
+            for batch in batches(new_stations, batch_size):
+                connection.execute(insert(Station), [
+                    dict(external_id=station.external_id,
+                         number=station.number,
+                         address=station.address,
+                         latitude=station.latitude,
+                         longitude=station.longitude,
+                         main_data_hash=station.main_data_hash) for station in batch
+                ])
+            report.add(Station.__tablename__, inserted=len(new_stations))
+            if new_stations:
+                # Данные 2 источника для новых станций нужно применить заново, даже если его ответ не изменился.
+                # Сбрасываем отпечаток 2 источника в той же транзакции, чтобы это пережило перезапуск
+                set_state_value(connection, SOURCE_FINGERPRINT_KEY.format(2), '')
+                set_state_value(connection, SOURCE_VALIDATORS_KEY.format(2), '')
+
+            update_stmt = update(Station) \
+                .where(Station.external_id == bindparam('b_external_id')) \
+                .values(number=bindparam('b_number'),
+                        address=bindparam('b_address'),
+                        latitude=bindparam('b_latitude'),
+                        longitude=bindparam('b_longitude'),
+                        main_data_hash=bindparam('b_main_data_hash'))
+            for batch in batches(changed_stations, batch_size):
+                connection.execute(update_stmt, [
+                    dict(b_external_id=station.external_id,
+                         b_number=station.number,
+                         b_address=station.address,
+                         b_latitude=station.latitude,
+                         b_longitude=station.longitude,
+                         b_main_data_hash=station.main_data_hash) for station in batch
+                ])
+            report.add(Station.__tablename__, updated=len(changed_stations))
+
+            # Услуги пересчитываем только для новых и измененных станций
+            sync_stations = new_stations + changed_stations
+            # {title: service_id}
+            services, created_services = service_id_cache.get_or_create(
+                connection, {title for station in sync_stations for title in station.additional_services})
+            if created_services:
+                LOGGER.info(f"Добавление новых типов услуг - {sorted(created_services)}")
+            report.add(Service.__tablename__, inserted=len(created_services))
+
+            db_station_services = set()  # {(station_id, service_id)}
+            for batch in batches([station.external_id for station in changed_stations], batch_size):
+                db_station_services.update(connection.execute(
+                    select(StationService.station_id, StationService.service_id)
+                    .where(StationService.station_id.in_(batch))
+                ).fetchall())
+            source_station_services = {(station.external_id, services[title])
+                                       for station in sync_stations for title in station.additional_services}
+
+            removed = sorted(db_station_services - source_station_services)
+            delete_stmt = delete(StationService).where(StationService.station_id == bindparam('b_station_id'),
+                                                       StationService.service_id == bindparam('b_service_id'))
+            for batch in batches(removed, batch_size):
+                connection.execute(delete_stmt, [dict(b_station_id=station_id, b_service_id=service_id)
+                                                 for station_id, service_id in batch])
+            added = sorted(source_station_services - db_station_services)
+            for batch in batches(added, batch_size):
+                connection.execute(insert(StationService), [dict(station_id=station_id, service_id=service_id)
+                                                            for station_id, service_id in batch])
+            report.add(StationService.__tablename__, inserted=len(added), deleted=len(removed))
+            report.station_ids.update(station.external_id for station in sync_stations)
+            if report.station_ids:
+                report.data_version = record_station_changes(connection, list(report.station_ids))
+        service_id_cache.add(created_services)
+        for station_id in report.station_ids:
+            station_info_cache.pop(station_id)
+        return report
+
+    @staticmethod
+    @run_in_db_executor
+    def bulk_sync_fuel_data(stations: Dict[int, GasStationFuelData],
+                            batch_size: int = SYNC_BATCH_SIZE) -> SyncReport:
+        """
+        Синхронизировать цены на топливо 2 источника одной транзакцией.
+        Разница по переданным станциям и видам топлива считается в памяти и применяется пачками через executemany.
+        :param stations: словарь {external_id: GasStationFuelData} только со станциями, у которых изменились цены
+        (отбираются по хешу в DataHandler); цены станций не из словаря не меняются
+        :param batch_size: размер пачки строк
+        :return: SyncReport с количеством вставленных/обновленных/удаленных строк по таблицам
+        """
+        report = SyncReport()
+        with engine.begin() as connection:
+            db_hash = dict(connection.execute(select(Station.external_id, Station.fuel_data_hash)).fetchall())
+            # Станции, которых еще нет в БД (нет данных от 1 источника), пропускаем
+            changed_stations = [station for station_id, station in stations.items()
+                                if station_id in db_hash and db_hash[station_id] != station.fuel_data_hash]
+
+            # {title: fuel_id}
+            fuels, created_fuels = fuel_id_cache.get_or_create(
+                connection, {_fuel.title for station in changed_stations for _fuel in station.fuel})
+            if created_fuels:
+                LOGGER.info(f"Добавление новых видов топлива - {sorted(created_fuels)}")
+            report.add(Fuel.__tablename__, inserted=len(created_fuels))
+
+            # station_fuels хранит id станции и топлива строками, поэтому приводим их к int
+            db_station_fuels = dict()  # {(station_id, fuel_id): (cost, currency)}
+            for batch in batches([station.external_id for station in changed_stations], batch_size):
+                for row in connection.execute(
+                        select(StationFuel.station_id, StationFuel.fuel_id, StationFuel.cost, StationFuel.currency)
+                        .where(StationFuel.station_id.in_(batch))
+                ):
+                    db_station_fuels[(int(row[0]), int(row[1]))] = (row[2], row[3])
+            source_station_fuels = {(station.external_id, fuels[_fuel.title]): (_fuel.cost, _fuel.currency)
+                                    for station in changed_stations for _fuel in station.fuel}
+
+            added = sorted(key for key in source_station_fuels if key not in db_station_fuels)
+            removed = sorted(key for key in db_station_fuels if key not in source_station_fuels)
+            # Обновляем топливо, если изменилась стоимость или валюта
+            updated = sorted(key for key in source_station_fuels
+                             if key in db_station_fuels and db_station_fuels[key] != source_station_fuels[key])
+
+            update_stmt = update(StationFuel) \
+                .where(StationFuel.station_id == bindparam('b_station_id'),
+                       StationFuel.fuel_id == bindparam('b_fuel_id')) \
+                .values(cost=bindparam('b_cost'),
+                        currency=bindparam('b_currency'))
+            for batch in batches(updated, batch_size):
+                connection.execute(update_stmt, [
+                    dict(b_station_id=station_id,
+                         b_fuel_id=fuel_id,
+                         b_cost=source_station_fuels[(station_id, fuel_id)][0],
+                         b_currency=source_station_fuels[(station_id, fuel_id)][1])
+                    for station_id, fuel_id in batch
+                ])
+            for batch in batches(added, batch_size):
+                connection.execute(insert(StationFuel), [
+                    dict(station_id=station_id,
+                         fuel_id=fuel_id,
+                         cost=source_station_fuels[(station_id, fuel_id)][0],
+                         currency=source_station_fuels[(station_id, fuel_id)][1])
+                    for station_id, fuel_id in batch
+                ])
+            delete_stmt = delete(StationFuel).where(StationFuel.station_id == bindparam('b_station_id'),
+                                                    StationFuel.fuel_id == bindparam('b_fuel_id'))
+            for batch in batches(removed, batch_size):
+                connection.execute(delete_stmt, [dict(b_station_id=station_id, b_fuel_id=fuel_id)
+                                                 for station_id, fuel_id in batch])
+            report.add(StationFuel.__tablename__, inserted=len(added), updated=len(updated), deleted=len(removed))
+
+            hash_stmt = update(Station) \
+                .where(Station.external_id == bindparam('b_external_id')) \
+                .values(fuel_data_hash=bindparam('b_fuel_data_hash'))
+            for batch in batches(changed_stations, batch_size):
+                connection.execute(hash_stmt, [dict(b_external_id=station.external_id,
+                                                    b_fuel_data_hash=station.fuel_data_hash) for station in batch])
+            report.add(Station.__tablename__, updated=len(changed_stations))
+            report.station_ids.update(station.external_id for station in changed_stations)
+            if report.station_ids:
+                report.data_version = record_station_changes(connection, list(report.station_ids))
+        fuel_id_cache.add(created_fuels)
+        for station_id in report.station_ids:
+            station_info_cache.pop(station_id)
+        return report
+
+
+class SyncStateRepository:
+    """
+    Интерфейс для работы со служебными данными синхронизации: версия данных и журнал изменений станций.
+    Значения sync_state записываются через state_engine: запись ждет транзакцию синхронизации
+    не дольше DB_STATE_WRITE_TIMEOUT.
+    """
+
+    @staticmethod
+    @run_in_db_executor
+    def get_value(key: str) -> Optional[str]:
+        """
+        Получить значение из sync_state.
+        """
+        with read_engine.connect() as connection:
+            return get_state_value(connection, key)
+
+    @staticmethod
+    @run_in_db_executor
+    def set_value(key: str, value: str) -> None:
+        """
+        Записать значение в sync_state.
+        """
+        with state_engine.begin() as connection:
+            set_state_value(connection, key, value)
+
+    @staticmethod
+    @run_in_db_executor
+    def get_values(keys: List[str]) -> Dict[str, str]:
+        """
+        Получить несколько значений из sync_state одним запросом.
+        :return: словарь {ключ: значение} для найденных ключей
+        """
+        with read_engine.connect() as connection:
+            return dict(connection.execute(select(SyncState.key, SyncState.value)
+                                           .where(SyncState.key.in_(keys))).fetchall())
+
+    @staticmethod
+    @run_in_db_executor
+    def set_values(values: Dict[str, str]) -> None:
+        """
+        Записать несколько значений в sync_state одной транзакцией.
+        """
+        with state_engine.begin() as connection:
+            for key, value in values.items():
+                set_state_value(connection, key, value)
+
+    @staticmethod
+    @run_in_db_executor
+    def get_data_version() -> int:
+        """
+        Получить текущую версию данных.
+        """
+        with read_engine.connect() as connection:
+            return int(get_state_value(connection, DATA_VERSION_KEY) or 0)
+
+    @staticmethod
+    @run_in_db_executor
+    def reset_change_log() -> int:
+        """
+        Увеличить версию данных и очистить журнал изменений.
+        Используется, когда изменения нельзя выразить списком станций (например, правка названия топлива в админке):
+        клиенты с более ранней версией получат полный список станций.
+        :return: новая версия данных
+        """
+        with engine.begin() as connection:
+            version = int(get_state_value(connection, DATA_VERSION_KEY) or 0) + 1
+            connection.execute(delete(StationChange))
+            set_state_value(connection, DATA_VERSION_KEY, str(version))
+            set_state_value(connection, CHANGE_LOG_START_KEY, str(version))
+            set_state_value(connection, DATA_UPDATED_AT_KEY, str(time.time()))
+            return version
+
+    @staticmethod
+    @run_in_db_executor
+    def get_changes_since(since: int, until: int) -> Optional[List[int]]:
+        """
+        Получить станции, изменившиеся в версиях (since, until].
+        :return: список external_id станций или None, если журнал за эти версии уже удален или еще не ведется
+        """
+        with read_engine.connect() as connection:
+            log_start = get_state_value(connection, CHANGE_LOG_START_KEY)
+            if log_start is None or since < int(log_start):
+                return None
+            res = connection.execute(
+                select(StationChange.station_id).distinct()
+                .where(StationChange.version > since, StationChange.version <= until)
+            )
+            return [row[0] for row in res.fetchall()]
+
+
+class SyncLeaseRepository:
+    """
+    Интерфейс для аренды ролей процессов (sync_leases). Время аренды считается по часам процесса,
+    поэтому все процессы должны работать на одном хосте с общей БД SQLite.
+    Аренда записывается через state_engine, чтобы ее продление не ждало в очереди за синхронизацией.
+    """
+
+    @staticmethod
+    @run_in_db_executor
+    def acquire(name: str, owner: str, ttl: float) -> bool:
+        """
+        Получить или продлить аренду роли name на ttl секунд.
+        Аренду получает процесс, который уже ее держит, или любой процесс, если срок аренды истек.
+        :return: True, если роль принадлежит owner
+        """
+        now = time.time()
+        with state_engine.begin() as connection:
+            res = connection.execute(
+                update(SyncLease)
+                .where(SyncLease.name == name, or_(SyncLease.owner == owner, SyncLease.expires_at < now))
+                .values(owner=owner, expires_at=now + ttl)
+            )
+            if res.rowcount:
+                return True
+        try:
+            with state_engine.begin() as connection:
+                connection.execute(insert(SyncLease).values(name=name, owner=owner, expires_at=now + ttl))
+            return True
+        except IntegrityError:
+            # Строка аренды уже есть, и ее держит другой процесс
+            return False
+
+    @staticmethod
+    @run_in_db_executor
+    def release(name: str, owner: str) -> None:
+        """
+        Освободить роль name, если ее держит owner, чтобы другой процесс мог получить ее не дожидаясь конца аренды.
+        """
+        with state_engine.begin() as connection:
+            connection.execute(
+                update(SyncLease).where(SyncLease.name == name, SyncLease.owner == owner).values(expires_at=0)
+            )
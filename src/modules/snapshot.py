@@ -0,0 +1,138 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from src.helpers import singleton, ApiAnswer, EncodedBody
+from src.helpers.compression import SUPPORTED_ENCODINGS
+from src.modules.repositories import SyncStateRepository
+from src.modules.stations import Stations
+from src.settings import SNAPSHOT_PATH
+
+__all__ = (
+    'StationsSnapshot'
+)
+
+LOGGER = logging.getLogger('main')
+
+
+@singleton
+class StationsSnapshot:
+    """
+    Снимок объединенного списка всех станций, заранее сериализованный в готовый к отправке JSON.
+
+    Собирается один раз и пересобирается только после того, как данные изменились:
+    синхронизация с источниками или правка через админку должны вызвать invalidate().
+    Если задан SNAPSHOT_PATH, собранный снимок сохраняется в файл вместе с версией данных, и другие процессы
+    с той же версией данных читают его из файла, а не собирают из БД.
+    """
+
+    def __init__(self):
+        self.body: Optional[EncodedBody] = None
+        self.stations: Dict[int, dict] = {}  # {external_id: данные станции из снимка}
+        self.built_at: Optional[datetime] = None
+        self.version: int = 0  # версия данных, не новее которой данные снимка
+        self.is_actual: bool = False
+        self.__lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        """
+        Пометить снимок устаревшим, он будет пересобран при следующем запросе.
+        """
+        self.is_actual = False
+
+    async def get(self) -> EncodedBody:
+        """
+        Получить сериализованный ответ со списком всех станций.
+        :return: тело ответа API и его сжатые копии
+        """
+        await self.__actualize()
+        return self.body
+
+    async def get_stations(self) -> Dict[int, dict]:
+        """
+        Получить данные станций из снимка.
+        :return: словарь {external_id: данные станции в виде GasStationUserValidData.dict()}
+        """
+        await self.__actualize()
+        return self.stations
+
+    async def get_version(self) -> int:
+        """
+        Получить версию данных актуального снимка.
+        """
+        await self.__actualize()
+        return self.version
+
+    async def __actualize(self) -> None:
+        if not self.is_actual or self.body is None:
+            async with self.__lock:
+                # Пока ждали блокировку, снимок мог собрать другой запрос
+                if not self.is_actual or self.body is None:
+                    await self.rebuild()
+
+    async def rebuild(self) -> None:
+        """
+        Пересобрать снимок из БД.
+        """
+        # Флаг ставим до сборки: если данные изменятся во время сборки, invalidate() сбросит его,
+        # и следующий запрос соберет снимок заново
+        self.is_actual = True
+        start_time = datetime.now()
+        try:
+            # Версию читаем до данных: данные снимка могут быть только новее версии
+            version = await SyncStateRepository.get_data_version()
+            shared = await asyncio.to_thread(self.__read_shared, version) if SNAPSHOT_PATH else None
+            if shared is None:
+                data = await Stations.get_all_stations_info()
+        except Exception:
+            self.is_actual = False
+            raise
+        if shared is None:
+            body = ApiAnswer.render_encoded(data)
+            if SNAPSHOT_PATH:
+                await asyncio.to_thread(self.__write_shared, version, body.body)
+        else:
+            raw_body, data = shared
+            body = ApiAnswer.encoded(raw_body)
+        # Сжатые копии готовим один раз на версию данных, вне event loop
+        await asyncio.to_thread(body.prepare, *SUPPORTED_ENCODINGS)
+        self.body = body
+        self.stations = {station['id']: station for station in data}
+        self.version = version
+        self.built_at = datetime.now()
+        LOGGER.info(f"Снимок списка станций версии {version} "
+                    f"{'пересобран' if shared is None else 'загружен из файла'}: {len(data)} станций, "
+                    f"{len(self.body)} байт, {(self.built_at - start_time).total_seconds():.2f}s")
+
+    @staticmethod
+    def __read_shared(version: int) -> Optional[Tuple[bytes, list]]:
+        """
+        Прочитать снимок из общего файла, если он собран для версии данных version.
+        Формат файла: версия данных в первой строке, далее тело ответа API.
+        :return: (тело ответа, список станций) или None
+        """
+        try:
+            with open(SNAPSHOT_PATH, 'rb') as file:
+                if int(file.readline()) != version:
+                    return None
+                body = file.read()
+            return body, json.loads(body)['data']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    @staticmethod
+    def __write_shared(version: int, body: bytes) -> None:
+        """
+        Сохранить снимок в общий файл. Файл заменяется целиком, чтобы другие процессы не прочитали его частично.
+        """
+        temp_path = f"{SNAPSHOT_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as file:
+                file.write(f"{version}\n".encode())
+                file.write(body)
+            os.replace(temp_path, SNAPSHOT_PATH)
+        except OSError as e:
+            LOGGER.warning(f"Не удалось сохранить снимок в {SNAPSHOT_PATH} - {e}")
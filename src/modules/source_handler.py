@@ -1,13 +1,23 @@
+import asyncio
+import json
 import logging
 import time
 import uuid
+from typing import Dict, Optional
 
 import aiohttp
 from datetime import datetime
 
-from src.helpers import singleton, BadRequest
+from src.helpers import (singleton, BadRequest, CircuitBreaker, station_main_data_hash, station_fuel_data_hash,
+                         combine_hashes)
 from src.modules import DataHandler
-from src.settings import SOURCE_1_URL, SOURCE_2_URL
+from src.modules.repositories import SyncStateRepository, SOURCE_FINGERPRINT_KEY, SOURCE_VALIDATORS_KEY
+from src.modules.metrics import (SOURCE_FETCH_LATENCY, SOURCE_PAYLOAD_SIZE, SOURCE_FETCH_ERRORS,
+                                 SYNC_PHASE_DURATION)
+from src.schemas import SourceResponse, SourceState
+from src.settings import (SOURCE_1_URL, SOURCE_2_URL, SOURCE_REQUEST_TIMEOUT, SOURCE_1_REQUEST_TIMEOUT,
+                          SOURCE_2_REQUEST_TIMEOUT, SOURCE_REQUEST_RETRIES, SOURCE_RETRY_BACKOFF,
+                          SOURCE_BREAKER_FAILURES, SOURCE_BREAKER_RESET_TIMEOUT)
 
 LOGGER = logging.getLogger('main')
 
@@ -20,59 +30,274 @@ class SourceHandler:
         self.source_2_url: str = SOURCE_2_URL
         self.last_gas_station_info_update_time: datetime = datetime.now()
         self.last_fuel_info_update_time: datetime = datetime.now()
+        # Отпечатки последних примененных ответов источников. Хранятся в sync_state и загружаются load_state,
+        # до загрузки - случайные значения, чтобы ответ источника был применен
         self.gas_station_info_hash: str = str(uuid.uuid1())  # uuid.UUID
         self.fuel_info_hash: str = str(uuid.uuid1())  # uuid.UUID
+        # Заголовки ETag/Last-Modified последних примененных ответов источников: {url: {header: value}}
+        self.validators: Dict[str, Dict[str, str]] = {}
+        self.timeouts: Dict[str, int] = {
+            self.source_1_url: SOURCE_1_REQUEST_TIMEOUT,
+            self.source_2_url: SOURCE_2_REQUEST_TIMEOUT,
+        }
+        # Состояние и автомат защиты для каждого источника
+        self.sources_state: Dict[int, SourceState] = {
+            1: SourceState(url=self.source_1_url),
+            2: SourceState(url=self.source_2_url),
+        }
+        self.breakers: Dict[int, CircuitBreaker] = {
+            1: CircuitBreaker(SOURCE_BREAKER_FAILURES, SOURCE_BREAKER_RESET_TIMEOUT),
+            2: CircuitBreaker(SOURCE_BREAKER_FAILURES, SOURCE_BREAKER_RESET_TIMEOUT),
+        }
+        # Данные 2 источника применяются только к существующим станциям, поэтому после добавления станций
+        # 1 источником данные 2 источника нужно применить повторно
+        self.source_2_resync_required: bool = False
+        # Запросы к источникам выполняются одновременно, а запись в БД - по очереди
+        self.__apply_lock = asyncio.Lock()
+        self.__session: Optional[aiohttp.ClientSession] = None
 
-    @staticmethod
-    async def __request(url: str) -> aiohttp.ClientResponse:
+    def __get_session(self) -> aiohttp.ClientSession:
+        """
+        Получить общую сессию с пулом keep-alive соединений к источникам.
+        Создается при первом запросе, так как требует запущенного event loop.
+        """
+        if self.__session is None or self.__session.closed:
+            self.__session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=SOURCE_REQUEST_TIMEOUT),
+            )
+        return self.__session
+
+    async def close(self) -> None:
+        """
+        Закрыть сессию и соединения к источникам.
+        """
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
+
+    async def load_state(self) -> None:
+        """
+        Загрузить из БД отпечатки и ETag/Last-Modified последних примененных ответов источников.
+        После перезапуска ответ неизменившегося источника сравнивается только с отпечатком, без сравнения станций.
+        """
+        keys = [key.format(source_id) for source_id in self.sources_state
+                for key in (SOURCE_FINGERPRINT_KEY, SOURCE_VALIDATORS_KEY)]
+        values = await SyncStateRepository.get_values(keys)
+        for source_id, state in self.sources_state.items():
+            fingerprint = values.get(SOURCE_FINGERPRINT_KEY.format(source_id))
+            if not fingerprint:
+                continue
+            if source_id == 1:
+                self.gas_station_info_hash = fingerprint
+            else:
+                self.fuel_info_hash = fingerprint
+            validators = values.get(SOURCE_VALIDATORS_KEY.format(source_id))
+            self.validators[state.url] = json.loads(validators) if validators else {}
+            LOGGER.info(f"Загружен отпечаток данных {source_id} источника {fingerprint}")
+
+    async def __save_state(self, source_id: int) -> None:
         """
-        Получить данные от источника по его url
+        Сохранить в БД отпечаток и ETag/Last-Modified последнего примененного ответа источника.
+        """
+        fingerprint = self.gas_station_info_hash if source_id == 1 else self.fuel_info_hash
+        await SyncStateRepository.set_values({
+            SOURCE_FINGERPRINT_KEY.format(source_id): fingerprint,
+            SOURCE_VALIDATORS_KEY.format(source_id): json.dumps(self.validators.get(self.sources_state[source_id].url,
+                                                                                    {})),
+        })
+
+    async def __request(self, url: str) -> SourceResponse:
+        """
+        Получить данные от источника по его url.
+        Отправляет условный запрос (If-None-Match/If-Modified-Since), если источник ранее вернул ETag/Last-Modified.
         :param url: путь к источнику
-        :return: response aiohttp.ClientResponse
+        :return: SourceResponse со статусом, заголовками и телом ответа, прочитанным один раз
         """
+        headers = {}
+        validators = self.validators.get(url, {})
+        if validators.get('ETag'):
+            headers['If-None-Match'] = validators['ETag']
+        if validators.get('Last-Modified'):
+            headers['If-Modified-Since'] = validators['Last-Modified']
         try:
             start_time = time.time()
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    LOGGER.info(
-                        f"url: {url} [get] [{response.status}] {(time.time() - start_time):.2f}s "
-                    )
-                    text = await response.text()
-                    return response
+            timeout = aiohttp.ClientTimeout(total=self.timeouts.get(url, SOURCE_REQUEST_TIMEOUT))
+            async with self.__get_session().get(url, headers=headers, timeout=timeout) as response:
+                body = await response.read()
+                latency = time.time() - start_time
+                LOGGER.info(
+                    f"url: {url} [get] [{response.status}] {len(body)}b {latency:.2f}s "
+                )
+                return SourceResponse(
+                    status=response.status,
+                    body=body,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                    latency=latency,
+                )
         except Exception as e:
             raise BadRequest(msg=f"Ошибка получения данных от {url} - {e}")
 
+    async def __fetch(self, source_id: int) -> SourceResponse:
+        """
+        Запросить источник с повторами и экспоненциальной задержкой.
+        Повторяются сетевые ошибки, таймауты и ответы 5xx, прочие ответы кроме 200 и 304 считаются ошибкой сразу.
+        Если подряд не удалось получить данные SOURCE_BREAKER_FAILURES раз, источник не опрашивается
+        SOURCE_BREAKER_RESET_TIMEOUT секунд.
+        :param source_id: номер источника
+        :return: SourceResponse
+        """
+        state = self.sources_state[source_id]
+        breaker = self.breakers[source_id]
+        if not breaker.allow_request():
+            state.circuit_state = breaker.state
+            raise BadRequest(msg=f"Источник {source_id} временно не опрашивается после ошибок - {state.last_error}",
+                             status_code=503)
+        attempt = 0
+        while True:
+            try:
+                response = await self.__request(state.url)
+                SOURCE_FETCH_LATENCY.observe(response.latency, source=source_id, status=response.status)
+                SOURCE_PAYLOAD_SIZE.observe(len(response.body), source=source_id)
+                if response.status in (200, 304):
+                    break
+                error = self.__bad_response_error(response)
+                is_retryable = response.status >= 500
+            except BadRequest as e:
+                error = e
+                is_retryable = True
+            SOURCE_FETCH_ERRORS.inc(source=source_id)
+            if not is_retryable or attempt >= SOURCE_REQUEST_RETRIES:
+                breaker.record_failure()
+                state.circuit_state = breaker.state
+                state.last_error_time = datetime.now()
+                state.last_error = str(error)
+                raise error
+            delay = SOURCE_RETRY_BACKOFF * 2 ** attempt
+            attempt += 1
+            LOGGER.warning(f"{error}. Повтор {attempt}/{SOURCE_REQUEST_RETRIES} через {delay:.1f}s")
+            await asyncio.sleep(delay)
+        breaker.record_success()
+        state.circuit_state = breaker.state
+        state.last_success_time = datetime.now()
+        state.last_latency = response.latency
+        return response
+
+    async def check_source(self, source_id: int) -> Optional[bool]:
+        """
+        Проверить на обновления один источник.
+        :param source_id: номер источника
+        :return: True - данные источника изменились, False - не изменились, None - ошибка проверки
+        """
+        check = self.check_source_1_for_updates if source_id == 1 else self.check_source_2_for_updates
+        try:
+            return bool(await check())
+        except Exception as e:
+            self.__log_error(source_id, e)
+            return None
+
+    @staticmethod
+    def __log_error(source_id: int, error: Exception) -> None:
+        if isinstance(error, BadRequest):
+            LOGGER.error(str(error))
+        else:
+            LOGGER.exception(f"Ошибка обработки данных {source_id} источника", exc_info=error)
+
+    def get_sources_state(self) -> Dict[int, dict]:
+        """
+        Получить состояние опроса источников.
+        :return: словарь {номер источника: SourceState в виде json-совместимого словаря}
+        """
+        for source_id, breaker in self.breakers.items():
+            self.sources_state[source_id].circuit_state = breaker.state
+        return {source_id: json.loads(state.json()) for source_id, state in self.sources_state.items()}
+
+    def __remember_validators(self, url: str, response: SourceResponse) -> bool:
+        """
+        Запомнить ETag/Last-Modified примененного ответа для следующих условных запросов.
+        :return: True, если заголовки изменились
+        """
+        validators = {header: value for header, value in (('ETag', response.etag),
+                                                          ('Last-Modified', response.last_modified))
+                      if value}
+        if self.validators.get(url) == validators:
+            return False
+        self.validators[url] = validators
+        return True
+
+    def __reset_source_2_fingerprint(self) -> None:
+        """
+        Сбросить запомненный ответ 2 источника, чтобы при следующей проверке его данные были применены заново.
+        """
+        self.fuel_info_hash = str(uuid.uuid1())
+        self.validators.pop(self.source_2_url, None)
+        self.source_2_resync_required = True
+
+    @staticmethod
+    def __bad_response_error(response: SourceResponse) -> BadRequest:
+        try:
+            detail = json.loads(response.body)
+        except ValueError:
+            detail = None
+        return BadRequest(msg=str(detail) if detail else {
+            "result": f"Ошибка выполнения запроса без ответа от сервиса"}, status_code=response.status)
+
     async def check_source_1_for_updates(self):
-        response = await self.__request(self.source_1_url)
+        with SYNC_PHASE_DURATION.time(source=1, phase='fetch'):
+            response = await self.__fetch(1)
+        if response.status == 304:
+            return False
         if response.status == 200:
-            data = await response.json()
+            with SYNC_PHASE_DURATION.time(source=1, phase='parse'):
+                data = json.loads(response.body)
             if data["status"] == "ok":
-                new_hash = str(uuid.uuid3(uuid.NAMESPACE_DNS, await response.text()))
+                # Хеши станций считаются один раз: из них получается хеш ответа и их же использует DataHandler
+                with SYNC_PHASE_DURATION.time(source=1, phase='hash'):
+                    hashes = {station["id"]: station_main_data_hash(station) for station in data["data"]}
+                    new_hash = combine_hashes(hashes)
                 if new_hash != self.gas_station_info_hash:
                     LOGGER.info(f"Проверка локальных данных от 1 источника")
-                    await DataHandler.update_source_1_data(data["data"])
-                    self.gas_station_info_hash = new_hash
+                    async with self.__apply_lock:
+                        report = await DataHandler.update_source_1_data(data["data"], hashes)
+                        if report.tables.get('stations') and report.tables['stations'].inserted:
+                            self.__reset_source_2_fingerprint()
+                        self.gas_station_info_hash = new_hash
+                        self.last_gas_station_info_update_time = datetime.now()
+                        self.sources_state[1].last_update_time = self.last_gas_station_info_update_time
+                        self.__remember_validators(self.source_1_url, response)
+                        await self.__save_state(1)
                     return True
                 else:
+                    if self.__remember_validators(self.source_1_url, response):
+                        async with self.__apply_lock:
+                            await self.__save_state(1)
                     return False
-        else:
-            raise BadRequest(msg=str(await response.json()) if await response.json() else {
-                "result": f"Ошибка выполнения запроса без ответа от сервиса"}, status_code=response.status)
 
     async def check_source_2_for_updates(self):
-        response = await self.__request(self.source_2_url)
-
+        with SYNC_PHASE_DURATION.time(source=2, phase='fetch'):
+            response = await self.__fetch(2)
+        if response.status == 304:
+            return False
         if response.status == 200:
-            data = await response.json()
+            with SYNC_PHASE_DURATION.time(source=2, phase='parse'):
+                data = json.loads(response.body)
             if data["status"] == "ok":
-                new_hash = str(uuid.uuid3(uuid.NAMESPACE_DNS, await response.text()))
+                with SYNC_PHASE_DURATION.time(source=2, phase='hash'):
+                    hashes = {station["id"]: station_fuel_data_hash(station) for station in data["data"]}
+                    new_hash = combine_hashes(hashes)
+                self.source_2_resync_required = False
                 if new_hash != self.fuel_info_hash:
                     LOGGER.info(f"Проверка локальных данных от 2 источника")
-                    await DataHandler.update_source_2_data(data["data"])
-                    self.fuel_info_hash = new_hash
+                    async with self.__apply_lock:
+                        await DataHandler.update_source_2_data(data["data"], hashes)
+                        self.fuel_info_hash = new_hash
+                        self.last_fuel_info_update_time = datetime.now()
+                        self.sources_state[2].last_update_time = self.last_fuel_info_update_time
+                        self.__remember_validators(self.source_2_url, response)
+                        await self.__save_state(2)
                     return True
                 else:
+                    if self.__remember_validators(self.source_2_url, response):
+                        async with self.__apply_lock:
+                            await self.__save_state(2)
                     return False
-        else:
-            raise BadRequest(msg=str(await response.json()) if await response.json() else {
-                "result": f"Ошибка выполнения запроса без ответа от сервиса"}, status_code=response.status)
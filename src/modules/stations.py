@@ -1,12 +1,19 @@
-from typing import List
+from collections import defaultdict
+from typing import List, Optional, Tuple
 
-from src.modules.repositories import GasStationRepository
-from src.schemas import GasStationUserValidData, FuelData, AdditionalServiceData
+from src.helpers import BadRequest, ApiAnswer, EncodedBody
+from src.modules.cache import station_info_cache
+from src.modules.repositories import GasStationRepository, STATION_FIELDS_COLUMNS
+from src.schemas import GasStationUserValidData, service_to_dict, fuel_to_dict, station_to_dict
 
 __all__ = (
-    'Stations'
+    'Stations',
+    'STATION_FIELDS',
 )
 
+# Поля станции в ответе API в порядке модели GasStationUserValidData
+STATION_FIELDS = tuple(GasStationUserValidData.__fields__)
+
 
 class Stations:
 
@@ -14,51 +21,117 @@ class Stations:
     async def get_all_stations_info() -> List[dict]:
         """
         Получить объединенный список с данными от 1 и 2 источника.
-        :return: Список с моделями GasStationUserValidData
+        :return: Список станций в форме GasStationUserValidData
         """
-        stations_list = []
         stations = await GasStationRepository.get_all_stations()
-        for station in stations:
-            station_fuels = await GasStationRepository.get_station_fuels_for_user(station[0])
-            station_services = await GasStationRepository.get_station_service_for_users(station[0])
-            stations_list.append(
-                GasStationUserValidData(
-                    id=station[0],
-                    number=station[1],
-                    address=station[2],
-                    latitude=station[3],
-                    longitude=station[4],
-                    additional_services=[AdditionalServiceData(title=service[1], img=service[2] if service[2] else '')
-                                         for service in
-                                         station_services],
-                    fuels=[FuelData(title=_fuel[1], cost=_fuel[2], currency=_fuel[3], img=_fuel[4] if _fuel[4] else '')
-                           for _fuel in
-                           station_fuels]
-                ).dict()
+        # Услуги и топливо получаем для всех станций сразу и группируем по id станции,
+        # вместо двух запросов на каждую станцию
+        stations_services = defaultdict(list)
+        for service in await GasStationRepository.get_all_station_services_for_users():
+            stations_services[int(service[0])].append(service_to_dict(service[2], service[3]))
+        stations_fuels = defaultdict(list)
+        for _fuel in await GasStationRepository.get_all_station_fuels_for_users():
+            stations_fuels[int(_fuel[0])].append(fuel_to_dict(_fuel[2], _fuel[3], _fuel[4], _fuel[5]))
+        return [
+            station_to_dict(
+                external_id=station[0],
+                number=station[1],
+                address=station[2],
+                latitude=station[4],
+                longitude=station[3],
+                additional_services=stations_services.get(station[0], []),
+                fuels=stations_fuels.get(station[0], []),
             )
-        return stations_list
+            for station in stations
+        ]
 
     @staticmethod
     async def get_station_info(station_id: int) -> dict:
         """
         Получить данные о конкретной станции
         :param station_id: external_id для станции
-        :return: Данные о станции в модели GasStationUserValidData
+        :return: Данные о станции в форме GasStationUserValidData
         """
-        station = (await GasStationRepository.get_station(station_id))[0]
+        stations = await GasStationRepository.get_station(station_id)
+        if not stations:
+            raise BadRequest(msg=f"Станция {station_id} не найдена", status_code=404)
+        station = stations[0]
         station_fuels = await GasStationRepository.get_station_fuels_for_user(station[0])
         station_services = await GasStationRepository.get_station_service_for_users(station[0])
-        station_valid_data = GasStationUserValidData(
-            id=station[0],
+        return station_to_dict(
+            external_id=station[0],
             number=station[1],
             address=station[2],
-            latitude=station[3],
-            longitude=station[4],
-            additional_services=[AdditionalServiceData(title=service[1], img=service[2] if service[2] else '')
-                                 for service in
-                                 station_services],
-            fuels=[FuelData(title=_fuel[1], cost=_fuel[2], currency=_fuel[3], img=_fuel[4] if _fuel[4] else '')
-                   for _fuel in
-                   station_fuels]
+            latitude=station[4],
+            longitude=station[3],
+            additional_services=[service_to_dict(service[1], service[2]) for service in station_services],
+            fuels=[fuel_to_dict(_fuel[1], _fuel[2], _fuel[3], _fuel[4]) for _fuel in station_fuels],
         )
-        return station_valid_data.dict()
+
+    @classmethod
+    async def get_station_info_body(cls, station_id: int) -> EncodedBody:
+        """
+        Получить сериализованный ответ API с данными о станции.
+        Ответ берется из кеша station_info_cache, при промахе собирается из БД и кладется в кеш.
+        Если станция изменилась, пока ответ собирался, ответ в кеш не попадет.
+        :param station_id: external_id для станции
+        :return: тело ответа API и его сжатые копии
+        """
+        body = station_info_cache.get(station_id)
+        if body is None:
+            generation = station_info_cache.generation(station_id)
+            body = ApiAnswer.render_encoded(await cls.get_station_info(station_id))
+            station_info_cache.set(station_id, body, generation)
+        return body
+
+    @staticmethod
+    def parse_fields(fields: Optional[str]) -> List[str]:
+        """
+        Разобрать список полей станции для ответа.
+        :param fields: поля через запятую, например "id,latitude,longitude,fuels". Если не передан - все поля
+        :return: список полей в порядке STATION_FIELDS, id всегда включен
+        """
+        if not fields:
+            return list(STATION_FIELDS)
+        requested = {field.strip() for field in fields.split(',') if field.strip()}
+        unknown = requested.difference(STATION_FIELDS)
+        if unknown:
+            raise BadRequest(msg=f"Неизвестные поля {sorted(unknown)}, доступны {list(STATION_FIELDS)}")
+        requested.add('id')
+        return [field for field in STATION_FIELDS if field in requested]
+
+    @staticmethod
+    async def get_stations_page(fields: List[str], cursor: Optional[int] = None,
+                                limit: Optional[int] = None) -> Tuple[List[dict], Optional[int]]:
+        """
+        Получить страницу станций, отсортированных по id, только с запрошенными полями.
+        Услуги и топливо запрашиваются из БД, только если они есть в fields.
+        :param fields: поля станции (см. Stations.parse_fields)
+        :param cursor: id станции, после которой начинается страница
+        :param limit: размер страницы, если не передан - все станции после cursor
+        :return: список станций и cursor для следующей страницы (None, если страница последняя)
+        """
+        column_fields = [field for field in fields if field in STATION_FIELDS_COLUMNS]
+        stations = await GasStationRepository.get_stations_page(column_fields, cursor, limit)
+        station_ids = [station[0] for station in stations]
+
+        stations_services = defaultdict(list)
+        if 'additional_services' in fields and station_ids:
+            for service in await GasStationRepository.get_all_station_services_for_users(station_ids):
+                stations_services[int(service[0])].append(service_to_dict(service[2], service[3]))
+        stations_fuels = defaultdict(list)
+        if 'fuels' in fields and station_ids:
+            for _fuel in await GasStationRepository.get_all_station_fuels_for_users(station_ids):
+                stations_fuels[int(_fuel[0])].append(fuel_to_dict(_fuel[2], _fuel[3], _fuel[4], _fuel[5]))
+
+        stations_list = []
+        for station in stations:
+            station_data = dict(id=station[0])
+            station_data.update(zip(column_fields, station[1:]))
+            if 'additional_services' in fields:
+                station_data['additional_services'] = stations_services.get(station[0], [])
+            if 'fuels' in fields:
+                station_data['fuels'] = stations_fuels.get(station[0], [])
+            stations_list.append({field: station_data[field] for field in fields})
+        next_cursor = station_ids[-1] if limit is not None and len(station_ids) == limit else None
+        return stations_list, next_cursor
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from src.helpers import singleton
+from src.modules.cache import station_info_cache, service_id_cache, fuel_id_cache
+from src.modules.geo_index import StationsGeoIndex
+from src.modules.price_index import FuelPriceIndex
+from src.modules.repositories import SyncStateRepository
+from src.modules.snapshot import StationsSnapshot
+from src.settings import DATA_VERSION_POLL_INTERVAL
+
+__all__ = (
+    'DataVersionWatcher',
+)
+
+LOGGER = logging.getLogger('main')
+
+
+@singleton
+class DataVersionWatcher:
+    """
+    Отслеживание версии данных в БД, которую меняют другие процессы: синхронизация ведущего процесса
+    или правка через админку в другом воркере. При изменении версии сбрасываются данные в памяти процесса:
+    по журналу изменений - только измененные станции, иначе - все.
+    """
+
+    def __init__(self):
+        self.version: Optional[int] = None
+        self.__task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        """
+        Запомнить текущую версию данных и запустить проверку версии в фоне.
+        """
+        if self.__task is None:
+            self.version = await SyncStateRepository.get_data_version()
+            self.__task = asyncio.create_task(self.__run())
+
+    def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    def advance(self, version: Optional[int]) -> None:
+        """
+        Учесть версию данных, созданную этим процессом: данные в памяти уже обновлены при ее записи.
+        Если перед ней есть версии других процессов, они будут применены при следующей проверке вместе с ней.
+        :param version: версия данных после изменения в этом процессе
+        """
+        if version is not None and self.version is not None and version == self.version + 1:
+            self.version = version
+
+    async def check(self) -> bool:
+        """
+        Проверить версию данных и применить изменения, сделанные другими процессами.
+        :return: True, если версия изменилась
+        """
+        version = await SyncStateRepository.get_data_version()
+        if self.version is None or version == self.version:
+            self.version = version
+            return False
+        station_ids = None
+        if version > self.version:
+            station_ids = await SyncStateRepository.get_changes_since(self.version, version)
+        LOGGER.info(f"Версия данных изменилась {self.version} -> {version}, "
+                    f"станций: {len(station_ids) if station_ids is not None else 'все'}")
+        self.version = version
+        await self.__apply(version, station_ids)
+        return True
+
+    @staticmethod
+    async def __apply(version: int, station_ids: Optional[List[int]]) -> None:
+        snapshot = StationsSnapshot()
+        if station_ids is None:
+            snapshot.invalidate()
+            station_info_cache.clear()
+            StationsGeoIndex().invalidate()
+            # Полный сброс - правка через админку, в том числе справочников услуг и топлива
+            service_id_cache.clear()
+            fuel_id_cache.clear()
+        else:
+            # Снимок, собранный не раньше этой версии (например, ведущим процессом после своей синхронизации),
+            # уже содержит изменения
+            if snapshot.version < version:
+                snapshot.invalidate()
+            for station_id in station_ids:
+                station_info_cache.pop(station_id)
+        price_index = FuelPriceIndex()
+        if station_ids is None:
+            price_index.invalidate()
+        else:
+            await price_index.update_stations(station_ids)
+        # Снимок собираем сразу: если задан SNAPSHOT_PATH, его сохраняет в общий файл первый собравший процесс,
+        # остальные читают файл вместо сборки снимка из БД
+        stations = await snapshot.get_stations()
+        if station_ids is not None:
+            geo_index = StationsGeoIndex()
+            for station_id in station_ids:
+                station = stations.get(station_id)
+                if station is None:
+                    geo_index.remove(station_id)
+                else:
+                    geo_index.update(station_id, station['latitude'], station['longitude'])
+
+    async def __run(self) -> None:
+        while True:
+            await asyncio.sleep(DATA_VERSION_POLL_INTERVAL)
+            try:
+                await self.check()
+            except Exception:
+                LOGGER.exception(f"Ошибка проверки версии данных")
@@ -1 +1 @@
-from .core import schedule
+from .core import SourceScheduler
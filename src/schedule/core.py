@@ -1,20 +1,107 @@
 import logging
+from datetime import datetime
+from typing import Dict, Set
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
 
+from src.helpers import singleton, AdaptiveInterval
 from src.modules import SourceHandler
+from src.settings import (SOURCE_1_POLL_MIN_INTERVAL, SOURCE_1_POLL_MAX_INTERVAL, SOURCE_2_POLL_MIN_INTERVAL,
+                          SOURCE_2_POLL_MAX_INTERVAL, SOURCE_POLLS_PER_CHANGE, SOURCE_POLL_JITTER)
 
 __all__ = (
-    'schedule',
+    'SourceScheduler',
 )
 
-from src.schedule.tasks import check_sources
+from src.schedule.tasks import check_source
 
 LOGGER = logging.getLogger('schedule')
 
 
-def schedule(source_handler: SourceHandler):
-    LOGGER.info('scheduler starting')
+@singleton
+class SourceScheduler:
+    """
+    Опрос каждого источника отдельной задачей планировщика со своим интервалом (см. AdaptiveInterval).
+    Задача источника не запускается повторно, пока не завершилась предыдущая, в том числе при запуске вне расписания.
+    """
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler()
+        self.intervals: Dict[int, AdaptiveInterval] = {
+            1: AdaptiveInterval(SOURCE_1_POLL_MIN_INTERVAL, SOURCE_1_POLL_MAX_INTERVAL, SOURCE_POLLS_PER_CHANGE),
+            2: AdaptiveInterval(SOURCE_2_POLL_MIN_INTERVAL, SOURCE_2_POLL_MAX_INTERVAL, SOURCE_POLLS_PER_CHANGE),
+        }
+        self.__running: Set[int] = set()
+        # Источники, которые нужно проверить еще раз сразу после текущей проверки
+        self.__pending: Set[int] = set()
+
+    def start(self) -> None:
+        if self.scheduler.running:
+            return
+        LOGGER.info('scheduler starting')
+        for source_id, interval in self.intervals.items():
+            self.scheduler.add_job(self.__check_source, self.__trigger(interval.interval), args=(source_id,),
+                                   id=self.__job_id(source_id), max_instances=1, coalesce=True,
+                                   misfire_grace_time=None)
+        self.scheduler.start()
+        for source_id in self.intervals:
+            self.__update_state(source_id)
+
+    def shutdown(self) -> None:
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    def sync_now(self, source_id: int) -> bool:
+        """
+        Запустить проверку источника сейчас, не дожидаясь расписания.
+        Если проверка источника уже выполняется, она будет повторена сразу после завершения текущей.
+        :param source_id: Номер источника
+        :return: False, если планировщик не запущен
+        """
+        job = self.scheduler.get_job(self.__job_id(source_id)) if self.scheduler.running else None
+        if job is None:
+            return False
+        if source_id in self.__running:
+            self.__pending.add(source_id)
+            return True
+        job.modify(next_run_time=datetime.now(self.scheduler.timezone))
+        self.__update_state(source_id)
+        return True
+
+    async def __check_source(self, source_id: int) -> None:
+        self.__running.add(source_id)
+        try:
+            # Повторная проверка выполняется в этом же запуске задачи: новый запуск планировщик пропустил бы
+            while True:
+                self.__pending.discard(source_id)
+                changed = await check_source(source_id)
+                if changed is not None:
+                    interval = self.intervals[source_id]
+                    previous = interval.interval
+                    if abs(interval.record(changed) - previous) >= 1:
+                        LOGGER.info(f"Интервал опроса {source_id} источника: "
+                                    f"{previous:.0f}s -> {interval.interval:.0f}s")
+                    self.scheduler.reschedule_job(self.__job_id(source_id), trigger=self.__trigger(interval.interval))
+                if source_id == 1 and SourceHandler().source_2_resync_required:
+                    # 1 источник добавил станции, данные 2 источника для них нужно применить сразу
+                    self.sync_now(2)
+                if source_id not in self.__pending:
+                    break
+        finally:
+            self.__running.discard(source_id)
+        self.__update_state(source_id)
+
+    def __update_state(self, source_id: int) -> None:
+        state = SourceHandler().sources_state[source_id]
+        job = self.scheduler.get_job(self.__job_id(source_id))
+        state.poll_interval = self.intervals[source_id].interval
+        state.next_poll_time = job.next_run_time if job is not None else None
 
-    scheduler = AsyncIOScheduler()
+    @staticmethod
+    def __trigger(interval: float) -> IntervalTrigger:
+        return IntervalTrigger(seconds=interval, jitter=interval * SOURCE_POLL_JITTER)
 
-    scheduler.add_job(check_sources, 'interval', seconds=900)
+    @staticmethod
+    def __job_id(source_id: int) -> str:
+        return f"check_source_{source_id}"
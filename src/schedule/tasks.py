@@ -1,18 +1,28 @@
 import logging
+from typing import Optional
 
-from src.helpers import BadRequest
-from src.modules import SourceHandler
+from src.db import track_queries
+from src.modules import SourceHandler, SyncLeader
+from src.settings import QUERY_STATS_ENABLED, QUERY_STATS_MAX_DB_TIME
 
 __all__ = (
-    'check_sources'
+    'check_source',
 )
 LOGGER = logging.getLogger('schedule')
 
 
-async def check_sources():
-    try:
-        source_handler = SourceHandler()
-        await source_handler.check_source_1_for_updates()
-        await source_handler.check_source_2_for_updates()
-    except BadRequest as e:
-        LOGGER.error(str(e))
+async def check_source(source_id: int) -> Optional[bool]:
+    """
+    Проверить источник на обновления, если процесс ведущий.
+    :param source_id: Номер источника
+    :return: True - данные изменились, False - не изменились, None - проверка пропущена или завершилась ошибкой
+    """
+    if not SyncLeader().is_leader:
+        LOGGER.info(f"Проверка {source_id} источника пропущена: синхронизацию выполняет другой процесс")
+        return None
+    with track_queries() as stats:
+        changed = await SourceHandler().check_source(source_id)
+    if QUERY_STATS_ENABLED:
+        log = LOGGER.warning if stats.duration > QUERY_STATS_MAX_DB_TIME else LOGGER.info
+        log(f"Проверка {source_id} источника выполнила {stats.count} запросов к БД за {stats.duration:.3f}s")
+    return changed
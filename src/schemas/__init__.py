@@ -1 +1,4 @@
 from .stations import GasStationMainData, GasStationFuelData, FuelData, GasStationUserValidData, AdditionalServiceData
+from .sync import TableSyncStats, SyncReport
+from .sources import SourceResponse, SourceState
+from .serializers import service_to_dict, fuel_to_dict, station_to_dict
@@ -0,0 +1,44 @@
+"""
+Быстрая сериализация данных из БД в ответы API без создания моделей pydantic.
+
+Функции формируют словари ровно той формы, которую описывают GasStationUserValidData, AdditionalServiceData
+и FuelData, и приводят типы так же, как это сделала бы валидация модели. Данные из своей БД считаются доверенными,
+поэтому сами модели остаются описанием контракта API (см. benchmarks/serializers.py).
+"""
+from typing import List, Optional
+
+__all__ = (
+    'service_to_dict',
+    'fuel_to_dict',
+    'station_to_dict',
+)
+
+
+def service_to_dict(title: str, img: Optional[str]) -> dict:
+    """
+    Данные услуги в форме AdditionalServiceData.
+    """
+    return {'title': title, 'img': img or ''}
+
+
+def fuel_to_dict(title: str, cost: float, currency: str, img: Optional[str]) -> dict:
+    """
+    Данные топлива в форме FuelData.
+    """
+    return {'title': title, 'cost': float(cost), 'currency': currency, 'img': img or ''}
+
+
+def station_to_dict(external_id: int, number: str, address: str, latitude: float, longitude: float,
+                    additional_services: List[dict], fuels: List[dict]) -> dict:
+    """
+    Данные станции в форме GasStationUserValidData.
+    """
+    return {
+        'id': external_id,
+        'number': number,
+        'address': address,
+        'latitude': float(latitude),
+        'longitude': float(longitude),
+        'additional_services': additional_services,
+        'fuels': fuels,
+    }
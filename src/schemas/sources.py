@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+__all__ = (
+    'SourceResponse',
+    'SourceState',
+)
+
+
+class SourceResponse(BaseModel):
+    status: int
+    body: bytes = b''
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    latency: float = 0  # секунды
+
+
+class SourceState(BaseModel):
+    url: str
+    circuit_state: str = 'closed'
+    last_success_time: Optional[datetime] = None
+    last_update_time: Optional[datetime] = None
+    last_error_time: Optional[datetime] = None
+    last_error: Optional[str] = None
+    last_latency: Optional[float] = None  # секунды
+    poll_interval: Optional[float] = None  # текущий интервал опроса в секундах
+    next_poll_time: Optional[datetime] = None
@@ -0,0 +1,37 @@
+from typing import Dict, Optional, Set
+
+from pydantic import BaseModel
+
+__all__ = (
+    'TableSyncStats',
+    'SyncReport',
+)
+
+
+class TableSyncStats(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+class SyncReport(BaseModel):
+    tables: Dict[str, TableSyncStats] = {}
+    station_ids: Set[int] = set()  # external_id станций, данные которых изменились
+    data_version: Optional[int] = None  # версия данных после синхронизации, если данные изменились
+
+    def add(self, table: str, inserted: int = 0, updated: int = 0, deleted: int = 0) -> None:
+        """
+        Добавить количество измененных строк для таблицы.
+        """
+        stats = self.tables.setdefault(table, TableSyncStats())
+        stats.inserted += inserted
+        stats.updated += updated
+        stats.deleted += deleted
+
+    @property
+    def is_changed(self) -> bool:
+        return any(stats.inserted or stats.updated or stats.deleted for stats in self.tables.values())
+
+    def __str__(self) -> str:
+        return ", ".join(f"{table}: +{stats.inserted} ~{stats.updated} -{stats.deleted}"
+                         for table, stats in self.tables.items()) or "без изменений"
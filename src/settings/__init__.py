@@ -1 +1 @@
-from .base import SOURCE_1_URL, SOURCE_2_URL
\ No newline at end of file
+from .base import *
@@ -2,15 +2,155 @@ import logging.config
 import os
 
 __all__ = (
+    'DATABASE_URL',
+    'DB_READ_WRITE_SPLIT',
+    'DB_WRITE_TIMEOUT',
+    'DB_STATE_WRITE_TIMEOUT',
+    'SQLITE_JOURNAL_MODE',
+    'SQLITE_SYNCHRONOUS',
+    'SQLITE_MMAP_SIZE',
+    'SQLITE_CACHE_SIZE',
+    'SQLITE_BUSY_TIMEOUT',
+    'SQLITE_TEMP_STORE',
     'SOURCE_1_URL',
-    'SOURCE_2_URL'
+    'SOURCE_2_URL',
+    'SOURCE_REQUEST_TIMEOUT',
+    'SOURCE_1_REQUEST_TIMEOUT',
+    'SOURCE_2_REQUEST_TIMEOUT',
+    'SOURCE_REQUEST_RETRIES',
+    'SOURCE_RETRY_BACKOFF',
+    'SOURCE_BREAKER_FAILURES',
+    'SOURCE_BREAKER_RESET_TIMEOUT',
+    'SOURCE_1_POLL_MIN_INTERVAL',
+    'SOURCE_1_POLL_MAX_INTERVAL',
+    'SOURCE_2_POLL_MIN_INTERVAL',
+    'SOURCE_2_POLL_MAX_INTERVAL',
+    'SOURCE_POLLS_PER_CHANGE',
+    'SOURCE_POLL_JITTER',
+    'SYNC_BATCH_SIZE',
+    'DB_EXECUTOR_WORKERS',
+    'GEO_INDEX_CELL_SIZE',
+    'GEO_SEARCH_MAX_RADIUS',
+    'GEO_SEARCH_MAX_LIMIT',
+    'STATIONS_PAGE_MAX_LIMIT',
+    'CHANGE_LOG_MAX_VERSIONS',
+    'STATION_CACHE_SIZE',
+    'STATION_CACHE_TTL',
+    'RESPONSE_COMPRESSION_LEVEL',
+    'RESPONSE_COMPRESSION_MIN_SIZE',
+    'QUERY_STATS_ENABLED',
+    'QUERY_STATS_MAX_QUERIES',
+    'QUERY_STATS_MAX_DB_TIME',
+    'PROFILE_SAMPLE_RATE',
+    'PROFILE_DIR',
+    'LEADER_LEASE_TTL',
+    'LEADER_RENEW_INTERVAL',
+    'DATA_VERSION_POLL_INTERVAL',
+    'SNAPSHOT_PATH',
 )
 
+DATABASE_URL = os.getenv('DATABASE_URL') if os.getenv('DATABASE_URL') else "sqlite:///example.db"
+# Отдельные пулы соединений: только для чтения (запросы API) и одно соединение для записи (синхронизация, админка)
+DB_READ_WRITE_SPLIT = os.getenv('DB_READ_WRITE_SPLIT', '1').lower() in ('1', 'true', 'yes')
+# Время ожидания соединения для записи в секундах: синхронизация и админка пишут через одно соединение, поэтому
+# запись ждет окончания самой долгой транзакции синхронизации
+DB_WRITE_TIMEOUT = float(os.getenv('DB_WRITE_TIMEOUT')) if os.getenv('DB_WRITE_TIMEOUT') else 30
+# Время ожидания короткой записи аренды роли и состояния источников (sync_state) в секундах. Такая запись идет через
+# отдельное соединение и не ждет окончания синхронизации дольше этого времени
+DB_STATE_WRITE_TIMEOUT = float(os.getenv('DB_STATE_WRITE_TIMEOUT')) if os.getenv('DB_STATE_WRITE_TIMEOUT') else 5
+# Настройки SQLite (PRAGMA) для каждого соединения. Значения по умолчанию SQLite: DELETE, FULL, 0, -2000, 5000, DEFAULT
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE') if os.getenv('SQLITE_JOURNAL_MODE') else 'WAL'
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS') if os.getenv('SQLITE_SYNCHRONOUS') else 'NORMAL'
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE')) if os.getenv('SQLITE_MMAP_SIZE') else 256 * 1024 * 1024  # байты
+# Размер кеша страниц: отрицательное значение - в Кб, положительное - в страницах
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE')) if os.getenv('SQLITE_CACHE_SIZE') else -16 * 1024
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT')) if os.getenv('SQLITE_BUSY_TIMEOUT') else 5000  # мс
+SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE') if os.getenv('SQLITE_TEMP_STORE') else 'MEMORY'
+
 SOURCE_1_URL = os.getenv('SOURCE_1_URL') if os.getenv('SOURCE_1_URL') else "http://127.0.0.1:8001/get_gas_station_info"
 SOURCE_2_URL = os.getenv('SOURCE_2_URL') if os.getenv('SOURCE_2_URL') else "http://127.0.0.1:8001/get_fuel_info"
 
+# Таймаут запроса к источнику, в секундах
+SOURCE_REQUEST_TIMEOUT = int(os.getenv('SOURCE_REQUEST_TIMEOUT')) if os.getenv('SOURCE_REQUEST_TIMEOUT') else 60
+SOURCE_1_REQUEST_TIMEOUT = int(os.getenv('SOURCE_1_REQUEST_TIMEOUT')) if os.getenv('SOURCE_1_REQUEST_TIMEOUT') \
+    else SOURCE_REQUEST_TIMEOUT
+SOURCE_2_REQUEST_TIMEOUT = int(os.getenv('SOURCE_2_REQUEST_TIMEOUT')) if os.getenv('SOURCE_2_REQUEST_TIMEOUT') \
+    else SOURCE_REQUEST_TIMEOUT
+# Количество повторов запроса к источнику при ошибке и базовая задержка между ними (удваивается), в секундах
+SOURCE_REQUEST_RETRIES = int(os.getenv('SOURCE_REQUEST_RETRIES')) if os.getenv('SOURCE_REQUEST_RETRIES') else 2
+SOURCE_RETRY_BACKOFF = float(os.getenv('SOURCE_RETRY_BACKOFF')) if os.getenv('SOURCE_RETRY_BACKOFF') else 1.0
+# После SOURCE_BREAKER_FAILURES неудачных проверок подряд источник не опрашивается SOURCE_BREAKER_RESET_TIMEOUT секунд
+SOURCE_BREAKER_FAILURES = int(os.getenv('SOURCE_BREAKER_FAILURES')) if os.getenv('SOURCE_BREAKER_FAILURES') else 3
+SOURCE_BREAKER_RESET_TIMEOUT = int(os.getenv('SOURCE_BREAKER_RESET_TIMEOUT')) \
+    if os.getenv('SOURCE_BREAKER_RESET_TIMEOUT') else 300
+
+# Интервал опроса каждого источника в секундах подстраивается под частоту изменения его данных в пределах
+# [MIN, MAX]: примерно SOURCE_POLLS_PER_CHANGE опросов между изменениями. Начальный интервал - среднее
+# геометрическое MIN и MAX. 1 источник меняется примерно раз в двое суток: 48 ч / 48 = 3600 с, 2 источник (цены) -
+# 2-3 раза в сутки, примерно раз в 8 ч: 8 ч / 48 = 600 с. Пределы выбраны так, чтобы эти значения были внутри них
+SOURCE_1_POLL_MIN_INTERVAL = int(os.getenv('SOURCE_1_POLL_MIN_INTERVAL')) \
+    if os.getenv('SOURCE_1_POLL_MIN_INTERVAL') else 900
+SOURCE_1_POLL_MAX_INTERVAL = int(os.getenv('SOURCE_1_POLL_MAX_INTERVAL')) \
+    if os.getenv('SOURCE_1_POLL_MAX_INTERVAL') else 14400
+SOURCE_2_POLL_MIN_INTERVAL = int(os.getenv('SOURCE_2_POLL_MIN_INTERVAL')) \
+    if os.getenv('SOURCE_2_POLL_MIN_INTERVAL') else 120
+SOURCE_2_POLL_MAX_INTERVAL = int(os.getenv('SOURCE_2_POLL_MAX_INTERVAL')) \
+    if os.getenv('SOURCE_2_POLL_MAX_INTERVAL') else 1800
+SOURCE_POLLS_PER_CHANGE = float(os.getenv('SOURCE_POLLS_PER_CHANGE')) if os.getenv('SOURCE_POLLS_PER_CHANGE') else 48
+# Случайное смещение времени опроса, доля интервала: воркеры и сервисы не опрашивают источник одновременно
+SOURCE_POLL_JITTER = float(os.getenv('SOURCE_POLL_JITTER')) if os.getenv('SOURCE_POLL_JITTER') else 0.1
+
+# Размер пачки строк для массовой синхронизации данных источников (executemany и списки IN)
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE')) if os.getenv('SYNC_BATCH_SIZE') else 500
+
+# Количество потоков в пуле для запросов к БД
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS')) if os.getenv('DB_EXECUTOR_WORKERS') else 4
+
+# Размер ячейки сетки пространственного индекса станций в градусах (0.1 - примерно 11 км по широте)
+GEO_INDEX_CELL_SIZE = float(os.getenv('GEO_INDEX_CELL_SIZE')) if os.getenv('GEO_INDEX_CELL_SIZE') else 0.1
+# Ограничения поиска ближайших станций: радиус в км и количество станций в ответе
+GEO_SEARCH_MAX_RADIUS = float(os.getenv('GEO_SEARCH_MAX_RADIUS')) if os.getenv('GEO_SEARCH_MAX_RADIUS') else 100
+GEO_SEARCH_MAX_LIMIT = int(os.getenv('GEO_SEARCH_MAX_LIMIT')) if os.getenv('GEO_SEARCH_MAX_LIMIT') else 100
+
+# Максимальный размер страницы списка станций
+STATIONS_PAGE_MAX_LIMIT = int(os.getenv('STATIONS_PAGE_MAX_LIMIT')) if os.getenv('STATIONS_PAGE_MAX_LIMIT') else 1000
+
+# Количество последних версий данных, для которых хранится журнал изменений станций
+CHANGE_LOG_MAX_VERSIONS = int(os.getenv('CHANGE_LOG_MAX_VERSIONS')) if os.getenv('CHANGE_LOG_MAX_VERSIONS') else 100
+
+# Кеш ответов по отдельной станции: количество станций и время жизни записи в секундах
+STATION_CACHE_SIZE = int(os.getenv('STATION_CACHE_SIZE')) if os.getenv('STATION_CACHE_SIZE') else 2000
+STATION_CACHE_TTL = int(os.getenv('STATION_CACHE_TTL')) if os.getenv('STATION_CACHE_TTL') else 600
+
+# Сжатие кешированных ответов (gzip, deflate): уровень сжатия и минимальный размер тела в байтах
+RESPONSE_COMPRESSION_LEVEL = int(os.getenv('RESPONSE_COMPRESSION_LEVEL')) \
+    if os.getenv('RESPONSE_COMPRESSION_LEVEL') else 6
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv('RESPONSE_COMPRESSION_MIN_SIZE')) \
+    if os.getenv('RESPONSE_COMPRESSION_MIN_SIZE') else 1024
+
+# Синхронизацию с источниками выполняет один процесс (ведущий) из нескольких воркеров: время аренды роли и интервал
+# ее продления в секундах. Самая долгая транзакция синхронизации должна укладываться в LEADER_LEASE_TTL, иначе
+# аренду не удастся продлить вовремя. Остальные процессы раз в DATA_VERSION_POLL_INTERVAL секунд проверяют версию данных
+LEADER_LEASE_TTL = int(os.getenv('LEADER_LEASE_TTL')) if os.getenv('LEADER_LEASE_TTL') else 60
+LEADER_RENEW_INTERVAL = int(os.getenv('LEADER_RENEW_INTERVAL')) if os.getenv('LEADER_RENEW_INTERVAL') else 20
+DATA_VERSION_POLL_INTERVAL = int(os.getenv('DATA_VERSION_POLL_INTERVAL')) \
+    if os.getenv('DATA_VERSION_POLL_INTERVAL') else 5
+# Файл общего для всех воркеров снимка списка станций. Пустое значение - каждый процесс собирает снимок из БД сам
+SNAPSHOT_PATH = os.getenv('SNAPSHOT_PATH') if os.getenv('SNAPSHOT_PATH') else ''
+
+# Подсчет запросов к БД на каждый HTTP запрос и запуск планировщика (заголовки X-DB-Queries, X-DB-Time-Ms).
+# Выключен по умолчанию. Запросы, превысившие количество запросов к БД или время в БД (секунды), пишутся в лог
+QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', '').lower() in ('1', 'true', 'yes')
+QUERY_STATS_MAX_QUERIES = int(os.getenv('QUERY_STATS_MAX_QUERIES')) if os.getenv('QUERY_STATS_MAX_QUERIES') else 20
+QUERY_STATS_MAX_DB_TIME = float(os.getenv('QUERY_STATS_MAX_DB_TIME')) if os.getenv('QUERY_STATS_MAX_DB_TIME') else 0.5
+
+# Доля HTTP запросов, для которых сохраняется профиль cProfile (0 - выключено), и каталог для профилей
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE')) if os.getenv('PROFILE_SAMPLE_RATE') else 0.0
+
 BASE_DIR = os.path.dirname(os.path.dirname((os.path.abspath(__file__))))
 
+PROFILE_DIR = os.getenv('PROFILE_DIR') if os.getenv('PROFILE_DIR') else os.path.join(BASE_DIR, 'profiles')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -76,4 +216,6 @@ LOGGING = {
     }
 }
 
+# Каталог логов не хранится в репозитории, создаем его при первом запуске
+os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
 logging.config.dictConfig(LOGGING)
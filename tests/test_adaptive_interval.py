@@ -0,0 +1,63 @@
+from src.helpers.adaptive_interval import AdaptiveInterval
+
+HOUR = 3600
+
+
+def poll(interval: AdaptiveInterval, now: float, until: float, change_every: float = None) -> float:
+    """
+    Опрашивать источник с текущим интервалом до момента until, данные меняются каждые change_every секунд.
+    :return: время последнего опроса
+    """
+    next_change = now + change_every if change_every else None
+    while now < until:
+        now += interval.interval
+        changed = next_change is not None and now >= next_change
+        if changed:
+            next_change += change_every
+        interval.record(changed, now)
+    return now
+
+
+def test_initial_interval_is_between_limits():
+    interval = AdaptiveInterval(120, 1800, 48)
+    assert 120 < interval.interval < 1800
+
+
+def test_first_change_shrinks_interval():
+    interval = AdaptiveInterval(120, 1800, 48, initial=1800)
+    interval.started_at = 0
+    interval.record(False, 1800)
+    assert interval.record(True, 2 * HOUR) == 2 * HOUR / 48
+
+
+def test_change_on_first_check_is_not_a_gap():
+    interval = AdaptiveInterval(120, 1800, 48)
+    interval.started_at = 0
+    interval.record(True, 1)
+    assert interval.change_interval is None
+
+
+def test_interval_tightens_to_change_rate():
+    interval = AdaptiveInterval(120, 1800, 48)
+    interval.started_at = 0
+    poll(interval, 0, 3 * 24 * HOUR, change_every=8 * HOUR)
+    assert abs(interval.change_interval - 8 * HOUR) < 0.05 * 8 * HOUR
+    assert 500 < interval.interval < 700
+
+
+def test_interval_relaxes_when_changes_stop_and_tightens_again():
+    interval = AdaptiveInterval(120, 1800, 48)
+    interval.started_at = 0
+    now = poll(interval, 0, 24 * HOUR, change_every=HOUR)
+    assert interval.interval < 200
+    now = poll(interval, now, now + 7 * 24 * HOUR)
+    assert interval.interval == 1800
+    poll(interval, now, now + 24 * HOUR, change_every=2 * HOUR)
+    assert interval.interval < 300
+
+
+def test_interval_is_clamped():
+    interval = AdaptiveInterval(120, 1800, 48)
+    interval.started_at = 0
+    poll(interval, 0, 24 * HOUR, change_every=60)
+    assert interval.interval == 120
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import shutil
+from collections import defaultdict
+
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.engine import Engine
+
+from src.db import migrate, Station, StationService, Service, StationFuel, Fuel
+from src.modules import repositories
+from src.modules.cache import service_id_cache, fuel_id_cache
+from src.modules.repositories import GasStationRepository
+from src.schemas import GasStationMainData, GasStationFuelData, FuelData
+
+EXAMPLE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example.db')
+
+
+def use_db_copy(monkeypatch, tmp_path) -> Engine:
+    """
+    Направить репозитории во временную копию example.db.
+    """
+    path = tmp_path / 'example.db'
+    shutil.copy(EXAMPLE_DB, path)
+    db_engine = create_engine(f"sqlite:///{path}")
+    migrate(db_engine)
+    for name in ('engine', 'read_engine', 'state_engine'):
+        monkeypatch.setattr(repositories, name, db_engine)
+    service_id_cache.clear()
+    fuel_id_cache.clear()
+    return db_engine
+
+
+def db_state(db_engine: Engine) -> dict:
+    """
+    Прочитать станции, их услуги и цены из БД.
+    :return: {external_id: (number, address, latitude, longitude, main_data_hash, fuel_data_hash, услуги, цены)}
+    """
+    with db_engine.connect() as connection:
+        services = defaultdict(set)
+        for station_id, title in connection.execute(
+                select(StationService.station_id, Service.title)
+                .join(Service, Service.id == StationService.service_id)):
+            services[int(station_id)].add(title)
+        fuels = defaultdict(dict)
+        for station_id, title, cost, currency in connection.execute(
+                select(StationFuel.station_id, Fuel.title, StationFuel.cost, StationFuel.currency)
+                .join(Fuel, Fuel.id == StationFuel.fuel_id)):
+            fuels[int(station_id)][title] = (cost, currency)
+        return {
+            station_id: (number, address, latitude, longitude, main_data_hash, fuel_data_hash,
+                         services[station_id], fuels[station_id])
+            for station_id, number, address, latitude, longitude, main_data_hash, fuel_data_hash in connection.execute(
+                select(Station.external_id, Station.number, Station.address, Station.latitude, Station.longitude,
+                       Station.main_data_hash, Station.fuel_data_hash))
+        }
+
+
+def main_data(station_id: int, state: tuple, **update) -> GasStationMainData:
+    number, address, latitude, longitude, main_data_hash, _, services, _ = state
+    return GasStationMainData(external_id=station_id, number=number, address=address, latitude=latitude,
+                              longitude=longitude, additional_services=sorted(services),
+                              main_data_hash=main_data_hash).copy(update=update)
+
+
+def test_bulk_sync_main_data_matches_db(monkeypatch, tmp_path):
+    db_engine = use_db_copy(monkeypatch, tmp_path)
+    before = db_state(db_engine)
+    station_ids = sorted(_id for _id, state in before.items() if len(state[6]) > 1)[:2]
+    moved_id, services_id = station_ids
+    new_id = max(before) + 1
+    moved = main_data(moved_id, before[moved_id], address='Новый адрес', latitude=1.5, main_data_hash='moved')
+    kept_service = sorted(before[services_id][6])[0]
+    services = main_data(services_id, before[services_id], additional_services=[kept_service, 'Новая услуга'],
+                         main_data_hash='services')
+    new = GasStationMainData(external_id=new_id, number='1', address='Адрес', latitude=2, longitude=3,
+                             additional_services=['Новая услуга'], main_data_hash='new')
+
+    report = asyncio.run(GasStationRepository.bulk_sync_main_data(
+        {moved_id: moved, services_id: services, new_id: new}, batch_size=1))
+
+    expected = dict(before)
+    number, _, _, longitude, _, fuel_data_hash, station_services, station_fuels = before[moved_id]
+    expected[moved_id] = (number, 'Новый адрес', 1.5, longitude, 'moved', fuel_data_hash, station_services,
+                          station_fuels)
+    expected[services_id] = before[services_id][:4] + ('services', before[services_id][5],
+                                                        {kept_service, 'Новая услуга'}, before[services_id][7])
+    expected[new_id] = ('1', 'Адрес', 2, 3, 'new', None, {'Новая услуга'}, {})
+    assert db_state(db_engine) == expected
+    assert report.station_ids == {moved_id, services_id, new_id}
+
+
+def test_bulk_sync_fuel_data_matches_db(monkeypatch, tmp_path):
+    db_engine = use_db_copy(monkeypatch, tmp_path)
+    before = db_state(db_engine)
+    station_id = min(_id for _id, state in before.items() if len(state[7]) > 1)
+    unchanged_id = max(_id for _id, state in before.items() if state[7])
+    kept_title, (kept_cost, kept_currency) = sorted(before[station_id][7].items())[0]
+    fuel = [FuelData(title=kept_title, cost=kept_cost + 1, currency=kept_currency),
+            FuelData(title='Новое топливо', cost=10, currency='RUB')]
+    unchanged_fuel = [FuelData(title='Новое топливо', cost=1, currency='RUB')]
+    stations = {
+        station_id: GasStationFuelData(external_id=station_id, fuel=fuel, fuel_data_hash='fuel'),
+        # Хеш совпадает с БД - станция не изменилась
+        unchanged_id: GasStationFuelData(external_id=unchanged_id, fuel=unchanged_fuel,
+                                         fuel_data_hash=before[unchanged_id][5]),
+        # Станции еще нет в БД
+        max(before) + 1: GasStationFuelData(external_id=max(before) + 1, fuel=fuel, fuel_data_hash='missing'),
+    }
+
+    report = asyncio.run(GasStationRepository.bulk_sync_fuel_data(stations, batch_size=1))
+
+    expected = dict(before)
+    expected[station_id] = before[station_id][:5] + ('fuel', before[station_id][6], {
+        kept_title: (kept_cost + 1, kept_currency), 'Новое топливо': (10, 'RUB')})
+    assert db_state(db_engine) == expected
+    assert report.station_ids == {station_id}
+    with db_engine.connect() as connection:
+        assert connection.execute(select(func.count()).where(Fuel.title == 'Новое топливо')).scalar() == 1
@@ -0,0 +1,42 @@
+from src.helpers.hashing import (canonical, content_hash, station_main_data_hash, station_fuel_data_hash,
+                                 combine_hashes)
+
+
+def test_canonical_normalizes_floats():
+    assert canonical(55) == canonical(55.0) == canonical(55.0000001) == 55
+    assert canonical(-0.0) == 0
+    assert canonical(49.1234564) == 49.123456
+    assert canonical(True) is True
+    assert canonical(None) is None
+
+
+def test_canonical_keeps_large_ints():
+    assert canonical(2 ** 53 + 1) == 2 ** 53 + 1
+    assert content_hash({'id': 2 ** 53}) != content_hash({'id': 2 ** 53 + 1})
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({'a': 1, 'b': [1, 2]}) == content_hash({'b': [1, 2], 'a': 1.0})
+    assert content_hash({'a': [1, 2]}) != content_hash({'a': [2, 1]})
+
+
+def test_content_hash_detects_changes():
+    assert content_hash({'cost': 50.1}) != content_hash({'cost': 50.2})
+    assert content_hash({'cost': 50.1}) == content_hash({'cost': 50.1000000001})
+
+
+def test_station_hashes_ignore_list_order():
+    station = dict(id=1, number='№ 1', address='Адрес', latitude=55.1, longitude=49.2, img_list=['a.png'],
+                   additional_services=['Кафе', 'Мойка'])
+    reordered = dict(reversed(list(station.items())), additional_services=['Мойка', 'Кафе'])
+    assert station_main_data_hash(station) == station_main_data_hash(reordered)
+
+    fuels = [dict(title='АИ-92', cost=50.1, currency='руб.'), dict(title='АИ-95', cost=55, currency='руб.')]
+    assert station_fuel_data_hash(dict(id=1, fuel=fuels)) == station_fuel_data_hash(dict(id=1, fuel=fuels[::-1]))
+    changed = [dict(fuels[0], cost=50.2), fuels[1]]
+    assert station_fuel_data_hash(dict(id=1, fuel=fuels)) != station_fuel_data_hash(dict(id=1, fuel=changed))
+
+
+def test_combine_hashes_ignores_station_order():
+    assert combine_hashes({1: 'a', 2: 'b'}) == combine_hashes({2: 'b', 1: 'a'})
+    assert combine_hashes({1: 'a', 2: 'b'}) != combine_hashes({1: 'b', 2: 'a'})
@@ -0,0 +1,79 @@
+import asyncio
+
+from src.modules.price_index import FuelPriceIndex
+from src.modules.repositories import GasStationRepository
+from src.modules.snapshot import StationsSnapshot
+
+
+def new_index() -> FuelPriceIndex:
+    index = FuelPriceIndex()
+    # Класс - синглтон, повторный __init__ сбрасывает индексы
+    index.__init__()
+    return index
+
+
+def test_cheapest_sorted_by_price():
+    index = new_index()
+    index.set_station_prices(1, [('ai92', 50.5, 'RUB')])
+    index.set_station_prices(2, [('ai92', 48.0, 'RUB')])
+    index.set_station_prices(3, [('ai92', 49.0, 'RUB')])
+    assert index.cheapest('ai92', 2) == [(2, 48.0, 'RUB'), (3, 49.0, 'RUB')]
+
+
+def test_set_station_prices_replaces_old_price():
+    index = new_index()
+    index.set_station_prices(1, [('ai92', 50.0, 'RUB'), ('dt', 60.0, 'RUB')])
+    index.set_station_prices(1, [('ai92', 45.0, 'RUB')])
+    assert index.prices['ai92'] == [(45.0, 1)]
+    assert index.cheapest('dt', 10) == []
+    assert index.stations[1] == {'ai92': (45.0, 'RUB')}
+
+
+def test_zero_price_is_not_indexed():
+    index = new_index()
+    index.set_station_prices(1, [('ai92', 0, 'RUB')])
+    index.set_station_prices(2, [('ai92', 50.0, 'RUB')])
+    assert index.cheapest('ai92', 10) == [(2, 50.0, 'RUB')]
+    assert index.cheapest('ai92', 10, station_ids=[1, 2]) == [(2, 50.0, 'RUB')]
+
+
+def test_station_without_fuels_is_removed():
+    index = new_index()
+    index.set_station_prices(1, [('ai92', 50.0, 'RUB')])
+    index.set_station_prices(1, [])
+    assert 1 not in index.stations
+    assert index.cheapest('ai92', 10) == []
+
+
+def test_cheapest_filters_by_currency_and_stations():
+    index = new_index()
+    index.set_station_prices(1, [('ai92', 1.0, 'USD')])
+    index.set_station_prices(2, [('ai92', 50.0, 'RUB')])
+    index.set_station_prices(3, [('ai92', 49.0, 'RUB')])
+    assert index.cheapest('ai92', 10, currency='RUB') == [(3, 49.0, 'RUB'), (2, 50.0, 'RUB')]
+    assert index.cheapest('ai92', 10, station_ids=[1, 2]) == [(1, 1.0, 'USD'), (2, 50.0, 'RUB')]
+
+
+def test_cheapest_stations_use_title_for_user(monkeypatch):
+    async def get_fuels():
+        return [(1, 'ai92', 'АИ-92')]
+
+    async def get_all_station_fuel_prices(station_ids=None):
+        return [(1, 'ai92', 50.0, 'RUB')]
+
+    async def get_stations():
+        return {1: dict(id=1), 2: dict(id=2)}
+
+    monkeypatch.setattr(GasStationRepository, 'get_fuels', get_fuels)
+    monkeypatch.setattr(GasStationRepository, 'get_all_station_fuel_prices', get_all_station_fuel_prices)
+    monkeypatch.setattr(StationsSnapshot(), 'get_stations', get_stations)
+    index = new_index()
+    asyncio.run(index.load())
+    # Цена новой станции приходит из источника, до этого индекс знает название только через load()
+    index.set_station_prices(2, [('ai92', 49.0, 'RUB')])
+    for title in ('ai92', 'АИ-92'):
+        stations = asyncio.run(index.get_cheapest_stations(title, 10))
+        assert [station['fuel'] for station in stations] == [
+            dict(title='АИ-92', cost=49.0, currency='RUB'),
+            dict(title='АИ-92', cost=50.0, currency='RUB'),
+        ]
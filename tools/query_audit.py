@@ -0,0 +1,208 @@
+"""
+Проверка планов запросов репозитория через EXPLAIN QUERY PLAN.
+
+Копирует БД во временный файл, по очереди вызывает методы репозиториев (GasStationRepository, SyncStateRepository,
+SyncLeaseRepository) с примерами аргументов, перехватывает выполненные SQL и для каждого получает план запроса.
+Полный проход по таблице (SCAN без индекса) считается ошибкой, если он не разрешен для метода в ALLOWED_SCANS.
+Код возврата 1 - есть неразрешенные SCAN или метод без примера аргументов.
+
+Запуск из корня репозитория:
+    python -m tools.query_audit --db example.db
+"""
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import sys
+import tempfile
+from collections import defaultdict
+
+# Методы, которые читают таблицу целиком намеренно: {метод: {таблица, ...}}.
+# Вызовы без фильтра по станциям записываются под ключом 'метод[all]': полный проход разрешен только им,
+# вызовы с фильтром по станциям должны использовать индекс
+ALLOWED_SCANS = {
+    'get_all_hash': {'stations'},
+    'get_all_fuel_hash': {'stations'},
+    'get_excluded_hash_stations': {'stations'},
+    'get_all_stations': {'stations'},
+    'get_all_station_services_for_users[all]': {'station_services'},
+    'get_all_station_fuels_for_users[all]': {'station_fuels'},
+    'get_all_station_fuel_prices[all]': {'station_fuels'},
+    'get_fuels': {'fuels'},
+    'bulk_sync_main_data': {'stations'},
+    'bulk_sync_fuel_data': {'stations'},
+    'reset_change_log': {'station_changes'},
+}
+
+SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(.*)$')
+
+
+def is_full_scan(detail: str):
+    """
+    Проверить строку плана на полный проход по таблице.
+    :param detail: Строка плана из EXPLAIN QUERY PLAN
+    :return: Название таблицы или None, если это не полный проход
+    """
+    match = SCAN_RE.match(detail)
+    if match is None or 'USING' in match.group(2):
+        return None
+    return match.group(1)
+
+
+async def collect_statements(statements: dict) -> list:
+    """
+    Вызвать методы репозиториев с примерами аргументов и собрать выполненные запросы.
+    :param statements: Словарь с текущим методом (current) и собранными запросами {метод: {sql: параметры}} (queries)
+    :return: Список методов репозиториев без примера аргументов
+    """
+    from src.db import Station, StationService, StationFuel, Service, Fuel, engine
+    from src.modules.repositories import GasStationRepository, SyncStateRepository, SyncLeaseRepository
+    from src.schemas import GasStationMainData, GasStationFuelData, FuelData
+    from sqlalchemy import select, func
+
+    with engine.connect() as connection:
+        station = connection.execute(
+            select(Station.external_id, Station.number, Station.address, Station.latitude, Station.longitude,
+                   Station.fuel_data_hash)
+            .where(Station.external_id.in_(select(StationService.station_id)))
+            .where(Station.external_id.in_(select(StationFuel.station_id)))
+            .limit(1)
+        ).first()
+        if station is None:
+            sys.exit('В БД нет станции с услугами и ценами, проверять нечего')
+        station_id = station.external_id
+        service_id = connection.execute(
+            select(StationService.service_id).where(StationService.station_id == station_id).limit(1)).scalar()
+        service_title = connection.execute(select(Service.title).where(Service.id == service_id)).scalar()
+        fuel_id, fuel_cost, fuel_currency = connection.execute(
+            select(StationFuel.fuel_id, StationFuel.cost, StationFuel.currency)
+            .where(StationFuel.station_id == station_id).limit(1)).first()
+        fuel_title = connection.execute(select(Fuel.title).where(Fuel.id == int(fuel_id))).scalar()
+        new_station_id = connection.execute(select(func.max(Station.external_id))).scalar() + 1
+
+    main_data = GasStationMainData(external_id=station_id, number=station.number, address=station.address,
+                                   latitude=station.latitude, longitude=station.longitude,
+                                   additional_services=[service_title, 'Услуга для проверки'],
+                                   main_data_hash='audit')
+    new_station = main_data.copy(update=dict(external_id=new_station_id))
+    fuel_data = GasStationFuelData(external_id=station_id, fuel_data_hash='audit', fuel=[
+        FuelData(title=fuel_title, cost=fuel_cost + 1, currency=fuel_currency),
+        FuelData(title='Топливо для проверки', cost=1, currency=fuel_currency)])
+
+    samples = {
+        'get_all_hash': (),
+        'get_all_fuel_hash': (),
+        'get_excluded_hash_stations': ([station.fuel_data_hash],),
+        'get_station_service_info': (station_id,),
+        'get_station_fuels': (station_id,),
+        'get_all_stations': (),
+        'get_station_service_for_users': (station_id,),
+        'get_station_fuels_for_user': (station_id,),
+        'get_all_station_services_for_users': ([station_id],),
+        'get_all_station_fuels_for_users': ([station_id],),
+        'get_all_station_fuel_prices': ([station_id],),
+        'get_fuels': (),
+        'get_stations_page': (['number', 'address'], station_id, 10),
+        'get_station': (station_id,),
+        'bulk_sync_main_data': ({station_id: main_data.copy(update=dict(main_data_hash='audit-2')),
+                                 new_station_id: new_station},),
+        'bulk_sync_fuel_data': ({station_id: fuel_data},),
+        'get_value': ('data_version',),
+        'set_value': ('audit', '1'),
+        'get_values': (['data_version', 'source_1_fingerprint'],),
+        'set_values': ({'audit': '1'},),
+        'get_data_version': (),
+        'reset_change_log': (),
+        'get_changes_since': (0, 1),
+        'acquire': ('audit', 'audit-owner', 60),
+        'release': ('audit', 'audit-owner'),
+    }
+
+    missing = []
+    for repository in (GasStationRepository, SyncStateRepository, SyncLeaseRepository):
+        for name in vars(repository):
+            if name.startswith('_'):
+                continue
+            if name not in samples:
+                missing.append(f"{repository.__name__}.{name}")
+                continue
+            statements['current'] = name
+            await getattr(repository, name)(*samples[name])
+    # Без фильтра по станциям эти методы читают таблицы целиком, это тоже нужно проверить
+    statements['current'] = 'get_all_station_services_for_users[all]'
+    await GasStationRepository.get_all_station_services_for_users()
+    statements['current'] = 'get_all_station_fuels_for_users[all]'
+    await GasStationRepository.get_all_station_fuels_for_users()
+    statements['current'] = 'get_all_station_fuel_prices[all]'
+    await GasStationRepository.get_all_station_fuel_prices()
+    statements['current'] = None
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='example.db', help='файл БД SQLite, проверяется его копия')
+    parser.add_argument('--verbose', action='store_true', help='вывести планы всех запросов')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='query_audit_')
+    database_path = os.path.join(temp_dir, 'audit.db')
+    shutil.copyfile(args.db, database_path)
+    # Engine создается при импорте src.db, поэтому адрес БД нужно подменить до импорта
+    os.environ['DATABASE_URL'] = f"sqlite:///{database_path}"
+
+    from sqlalchemy import event
+    from src.db import engine, read_engine, state_engine, migrate
+    migrate(engine)
+
+    statements = {'current': None, 'queries': defaultdict(dict)}
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statements['current'] is None:
+            return
+        if executemany:
+            parameters = parameters[0] if parameters else ()
+        statements['queries'][statements['current']].setdefault(statement, parameters)
+
+    # Репозитории читают через read_engine и пишут через engine и state_engine
+    # (при DB_READ_WRITE_SPLIT это разные engine)
+    for db_engine in {engine, read_engine, state_engine}:
+        event.listen(db_engine, 'before_cursor_execute', capture)
+
+    try:
+        missing = asyncio.run(collect_statements(statements))
+
+        problems = 0
+        connection = engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for method, queries in statements['queries'].items():
+                for statement, parameters in queries.items():
+                    plan = [row[3] for row in cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+                    scans = [(table, detail) for detail in plan
+                             if (table := is_full_scan(detail)) and table not in ALLOWED_SCANS.get(method, ())]
+                    if scans or args.verbose:
+                        print(f"{method}: {' '.join(statement.split())}")
+                        for detail in plan:
+                            print(f"    {detail}")
+                    for table, detail in scans:
+                        problems += 1
+                        print(f"  ! полный проход по таблице {table}")
+        finally:
+            connection.close()
+    finally:
+        engine.dispose()
+        read_engine.dispose()
+        state_engine.dispose()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    for name in missing:
+        print(f"Нет примера аргументов для {name}, добавьте его в samples")
+    print(f"Запросов: {sum(len(queries) for queries in statements['queries'].values())}, "
+          f"неразрешенных SCAN: {problems}, методов без примера: {len(missing)}")
+    sys.exit(1 if problems or missing else 0)
+
+
+if __name__ == '__main__':
+    main()